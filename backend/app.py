@@ -1,7 +1,29 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g, stream_with_context
 from datetime import datetime, date, timedelta
-from cs50 import SQL
-from werkzeug.security import generate_password_hash, check_password_hash
+import base64
+import click
+import csv
+import hmac
+import io
+import json
+import os
+import time
+
+from archive import ArchiveError, Archives, archived_before, init_archive
+from catalog import Catalog, init_catalog
+from changes import changes_since, init_changes, record_change
+from database import Database
+from group_commit import GroupCommitWriter
+from invalidation import InvalidationLog, init_invalidation
+from lru import LRUCache
+from metrics import Metrics
+from passwords import HasherBusy, PasswordHasher
+from slow_queries import SlowQueryLog
+from snapshots import close_days, init_snapshots, snapshot_history, snapshot_z_totals
+from stores import StoreError, StoreReports, merge_products, merge_z, parse_stores
+from users import UserDirectory
+from rollups import init_rollups, apply_order, rebuild_rollups, product_totals
+from search import index_order, init_search, match_query
 
 from flask_jwt_extended import (
     JWTManager,
@@ -9,14 +31,96 @@ from flask_jwt_extended import (
     set_access_cookies,
     unset_jwt_cookies,
     jwt_required,
+    get_jwt,
     get_jwt_identity
 )
 
 app = Flask(__name__)
-db = SQL("sqlite:///pos.db")
+db = Database(
+    os.environ.get("POS_DB_PATH", "pos.db"),
+    synchronous=os.environ.get("POS_SQLITE_SYNCHRONOUS", "NORMAL"),
+)
+
+
+# Latency metrics served at GET /api/metrics (POS_METRICS=0 turns recording off)
+metrics = Metrics() if os.environ.get("POS_METRICS", "1") != "0" else None
+# Scrapers send Authorization: Bearer $POS_METRICS_TOKEN; POS_METRICS_PUBLIC=1 opts in to unauthenticated scraping
+METRICS_TOKEN = os.environ.get("POS_METRICS_TOKEN")
+METRICS_PUBLIC = os.environ.get("POS_METRICS_PUBLIC") == "1"
+
+# Statements over POS_SLOW_QUERY_MS, or planned as a full table scan, are logged
+# with params and EXPLAIN QUERY PLAN (POS_SLOW_QUERY_MS=off disables)
+SLOW_QUERY_MS = os.environ.get("POS_SLOW_QUERY_MS", "100")
+slow_query_log = None if SLOW_QUERY_MS == "off" else SlowQueryLog(
+    db,
+    threshold_ms=float(SLOW_QUERY_MS),
+    path=os.environ.get("POS_SLOW_QUERY_LOG", "slow_queries.log"),
+    forward=metrics,
+)
+
+
+@app.before_request
+def start_request_timer():
+    if metrics is not None:
+        g.request_started = time.perf_counter()
+        metrics.request_started()
+
+
+@app.after_request
+def record_request_timing(resp):
+    started = g.get("request_started")
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.request_finished(request.method, route, resp.status_code, time.perf_counter() - started)
+    return resp
+
+
+@app.teardown_appcontext
+def release_db_connection(exc):
+    db.release()
+    archives.release()
+
 
 # --- DB bootstrap
+# Bump whenever create_schema() changes so existing databases run it again.
+# That includes trigger definitions: catalog.py's triggers are only dropped
+# and recreated when this version moves
+SCHEMA_VERSION = 4
+
+
 def init_db():
+    # Restarts against a current database skip every DDL statement
+    if db.execute("PRAGMA user_version")[0]["user_version"] >= SCHEMA_VERSION:
+        return
+    with db.transaction():
+        # Another worker may have finished while this one waited for the write lock
+        if db.execute("PRAGMA user_version")[0]["user_version"] >= SCHEMA_VERSION:
+            return
+        create_schema()
+        db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+def create_schema():
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL UNIQUE,
+            hash TEXT NOT NULL
+        )
+    """)
+
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            alias TEXT NOT NULL,
+            category TEXT NOT NULL,
+            list_price INTEGER NOT NULL,
+            image_url TEXT,
+            is_active INTEGER DEFAULT 1
+        )
+    """)
+
     db.execute("""
         CREATE TABLE IF NOT EXISTS payment_methods (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -32,9 +136,16 @@ def init_db():
             subtotal_cents INTEGER NOT NULL,
             total_paid_cents INTEGER NOT NULL,
             change_cents INTEGER NOT NULL,
-            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            status TEXT NOT NULL DEFAULT 'paid',
+            voided_at TEXT NULL,
+            void_reason TEXT NULL,
+            original_order_id INTEGER NULL,
+            client_ref TEXT NULL
         )
     """)
+    # Idempotency key for offline till replays (POST /api/orders/batch)
+    db.ensure_column("orders", "client_ref", "TEXT NULL")
 
     db.execute("""
         CREATE TABLE IF NOT EXISTS order_lines (
@@ -58,12 +169,65 @@ def init_db():
         )
     """)
 
+    # Reports and history filter on UTC created_at bounds, so these must exist
+    db.execute("CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders(created_at)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_order_lines_order_id ON order_lines(order_id)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_payments_order_id ON payments(order_id)")
+    db.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_client_ref ON orders(client_ref) WHERE client_ref IS NOT NULL"
+    )
+
     db.execute("INSERT OR IGNORE INTO payment_methods (name) VALUES (?)", "Cash")
     db.execute("INSERT OR IGNORE INTO payment_methods (name) VALUES (?)", "Deposit")
     db.execute("INSERT OR IGNORE INTO payment_methods (name) VALUES (?)", "Card")
 
+    init_catalog(db)
+    init_invalidation(db)
+    init_archive(db)
+    init_search(db)
+    init_changes(db)
+    # Rollup days of archived months are kept as they are; their raw rows live elsewhere
+    init_rollups(db, archived_before(db))
+    init_snapshots(db)
+
 
 init_db()
+catalog = Catalog(db)
+users = UserDirectory(db)
+# Closed months of orders moved out by `flask --app app archive-orders`
+archives = Archives(
+    db,
+    os.environ.get("POS_ARCHIVE_DIR")
+    or os.path.join(os.path.dirname(os.path.abspath(db.path)), "archive"),
+)
+
+# Login/register key derivation runs on its own small pool (see passwords.py);
+# POS_PASSWORD_HASH_METHOD sets the work factor, e.g. "scrypt:32768:8:1" or "pbkdf2:sha256:600000".
+# Each waiting hash holds a request thread, so by default one of the POS_THREADS
+# threads per worker (gunicorn.conf.py) is always left for checkout.
+hasher = PasswordHasher(
+    workers=int(os.environ.get("POS_PASSWORD_HASH_WORKERS", "2")),
+    max_in_flight=int(
+        os.environ.get("POS_PASSWORD_HASH_MAX_IN_FLIGHT")
+        or max(int(os.environ.get("POS_THREADS", "4")) - 1, 1)
+    ),
+    method=os.environ.get("POS_PASSWORD_HASH_METHOD") or None,
+)
+if metrics is not None:
+    metrics.add_collector(hasher.metric_lines)
+
+# Multi-store mode: other stores' pos.db files this deployment reports over
+# with ?stores= (see stores.py), e.g. POS_STORES="centro=/data/centro/pos.db,norte=/data/norte/pos.db"
+store_reports = None
+if os.environ.get("POS_STORES"):
+    store_reports = StoreReports(
+        parse_stores(os.environ["POS_STORES"]),
+        workers=int(os.environ.get("POS_STORE_REPORT_WORKERS", "0")) or None,
+        timeout=float(os.environ.get("POS_STORE_REPORT_TIMEOUT", "30")),
+    )
+# Attached after bootstrap so one-off DDL doesn't become metric series
+db.observer = slow_query_log or metrics
 
 # JWT cookie setup (minimal)
 app.config["JWT_SECRET_KEY"] = (
@@ -78,6 +242,71 @@ app.config["JWT_COOKIE_CSRF_PROTECT"] = False    # baby steps
 
 jwt = JWTManager(app)
 
+# Offline till sync: orders accepted per POST /api/orders/batch. A replayed
+# createdAt may be at most REPLAY_WINDOW_DAYS old, and ahead of the server
+# clock by at most REPLAY_CLOCK_SKEW_SECONDS (a till clock running fast)
+ORDER_BATCH_MAX = 1000
+REPLAY_WINDOW_DAYS = int(os.environ.get("POS_REPLAY_WINDOW_DAYS", "7"))
+REPLAY_CLOCK_SKEW_SECONDS = int(os.environ.get("POS_REPLAY_CLOCK_SKEW_SECONDS", "300"))
+
+ORDER_DETAIL_CACHE_SIZE = int(os.environ.get("POS_ORDER_CACHE_SIZE", "4096"))
+
+# Order history page size (keyset pagination on created_at, id)
+ORDERS_PAGE_DEFAULT = 100
+ORDERS_PAGE_MAX = 500
+
+# GET /api/changes page size
+CHANGES_PAGE_DEFAULT = 100
+CHANGES_PAGE_MAX = 1000
+
+# Rows fetched from SQLite per chunk by GET /api/orders/export
+EXPORT_CHUNK_ROWS = 2000
+
+
+@app.cli.command("rebuild-rollups")
+def rebuild_rollups_command():
+    rebuild_rollups(db, archives.archived_before())
+    print("rollups rebuilt")
+    # Closed days whose figures changed get a new snapshot version
+    result = close_days(db, recheck=True)
+    print(f"z snapshots: {result['closed']} days closed, {result['rebuilt']} rebuilt")
+
+
+@app.cli.command("close-days")
+def close_days_command():
+    result = close_days(db)
+    print(f"z snapshots: {result['closed']} days closed, {result['rebuilt']} rebuilt")
+
+
+@app.cli.command("archive-orders")
+@click.option("--month", "months", multiple=True, help="business month YYYY-MM (repeatable)")
+@click.option("--keep-months", default=3, show_default=True,
+              help="without --month: archive every month older than this many full months")
+def archive_orders_command(months, keep_months):
+    # Oldest first; each month is its own copy-then-delete, so a failure leaves earlier months archived
+    for month in sorted(months) or archives.closed_months(keep_months):
+        try:
+            moved = archives.archive_month(month)
+        except ArchiveError as e:
+            raise click.ClickException(str(e))
+        print(f"{month}: archived {moved} orders")
+    db.release()
+
+
+# Business day runs on local time (UTC-6); created_at is stored in UTC
+BUSINESS_DAY_OFFSET = timedelta(hours=6)
+
+# Local-hour [start, end) day-parts for the hourly report; other hours report as "other"
+DAY_PARTS = (("breakfast", 6, 11), ("lunch", 11, 16), ("dinner", 16, 22))
+
+
+# UTC [start, end) timestamps covering business days start_date..end_date
+def business_day_bounds(start_date, end_date):
+    start = datetime.strptime(start_date, "%Y-%m-%d") + BUSINESS_DAY_OFFSET
+    end = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1) + BUSINESS_DAY_OFFSET
+    return start.strftime("%Y-%m-%d %H:%M:%S"), end.strftime("%Y-%m-%d %H:%M:%S")
+
+
 def resolve_date_range(start_date, end_date):
     def is_valid(d):
         try:
@@ -103,18 +332,31 @@ def resolve_date_range(start_date, end_date):
     if start_date > end_date:
         return None, "start_date must be <= end_date"
 
-    end_exclusive = (
-        datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)
-    ).strftime("%Y-%m-%d")
+    start_ts, end_ts_exclusive = business_day_bounds(start_date, end_date)
 
     return {
         "start": start_date,
         "end": end_date,
-        "start_ts": f"{start_date} 00:00:00",
-        "end_ts_exclusive": f"{end_exclusive} 00:00:00",
+        "start_ts": start_ts,
+        "end_ts_exclusive": end_ts_exclusive,
     }, None
 
 
+# Opaque keyset cursor for order history: last (created_at, id) seen
+def encode_cursor(created_at, order_id):
+    raw = json.dumps([created_at, order_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, order_id = json.loads(raw)
+        return (str(created_at), int(order_id)), None
+    except Exception:
+        return None, "invalid cursor"
+
+
 def validate_register(data):
     data = data or {}
     username = (data.get("username") or "").strip()
@@ -138,6 +380,49 @@ def health():
     return jsonify({"ok": True})
 
 
+def bearer_is(token):
+    supplied = request.headers.get("Authorization", "")
+    return hmac.compare_digest(supplied.encode(), f"Bearer {token}".encode())
+
+
+@app.get("/api/metrics")
+def get_metrics():
+    # Scraped by Prometheus, so no JWT cookie; closed until a token is set or
+    # open scraping is explicitly allowed
+    if metrics is None:
+        return jsonify({"ok": False, "error": "metrics disabled"}), 404
+    if not METRICS_PUBLIC and not (METRICS_TOKEN and bearer_is(METRICS_TOKEN)):
+        return jsonify({"ok": False, "error": "unauthorized"}), 401
+    return app.response_class(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.get("/api/debug/slow-queries")
+def get_slow_queries():
+    # Statements and plans are for operators, not cashiers: the metrics token only
+    if not METRICS_TOKEN or not bearer_is(METRICS_TOKEN):
+        return jsonify({"ok": False, "error": "unauthorized"}), 401
+    if slow_query_log is None:
+        return jsonify({"ok": False, "error": "slow-query log disabled"}), 404
+    reason = request.args.get("reason")
+    entries = [e for e in slow_query_log.recent() if reason is None or e["reason"] == reason]
+    return jsonify({"ok": True, "threshold_ms": float(SLOW_QUERY_MS), "entries": entries}), 200
+
+
+def access_token(user_id, username):
+    # Username rides along as a claim so /api/me needs no lookup
+    return create_access_token(
+        identity=str(user_id),  # MUST be string
+        additional_claims={"username": username},
+    )
+
+
+def user_json(user_id, names):
+    # names: {user_id: username} from users.usernames(); deleted users render as None
+    if user_id is None or user_id not in names:
+        return None
+    return {"id": user_id, "username": names[user_id]}
+
+
 @app.post("/api/register")
 def register():
     data = request.get_json(silent=True) or {}
@@ -147,7 +432,10 @@ def register():
         return jsonify({"ok": False, "error": error}), 400
 
     username = cleaned["username"]
-    pw_hash = generate_password_hash(cleaned["password"])
+    try:
+        pw_hash = hasher.hash(cleaned["password"])
+    except HasherBusy:
+        return jsonify({"ok": False, "error": "server busy, try again"}), 503
 
     try:
         user_id = db.execute(
@@ -161,7 +449,8 @@ def register():
         return jsonify({"ok": False, "error": "database error"}), 500
 
     # REGISTER == LOGIN: set JWT cookie
-    token = create_access_token(identity=str(user_id))  # MUST be string
+    users.remember(user_id, username)
+    token = access_token(user_id, username)
     resp = jsonify({"ok": True})
     set_access_cookies(resp, token)
     return resp, 200
@@ -183,10 +472,21 @@ def login():
         return jsonify({"ok": False, "error": "invalid username and/or password"}), 400
 
     user = rows[0]
-    if not check_password_hash(user["hash"], password):
-        return jsonify({"ok": False, "error": "invalid username and/or password"}), 400
+    try:
+        if not hasher.verify(user["hash"], password):
+            return jsonify({"ok": False, "error": "invalid username and/or password"}), 400
+    except HasherBusy:
+        return jsonify({"ok": False, "error": "server busy, try again"}), 503
 
-    token = create_access_token(identity=str(user["id"]))  # MUST be string
+    if hasher.needs_rehash(user["hash"]):
+        # Work factor changed since this hash was made; upgrade it while we have the password
+        try:
+            db.execute("UPDATE users SET hash = ? WHERE id = ?", hasher.hash(password), user["id"])
+        except HasherBusy:
+            pass  # the password checked out; upgrade on a later, quieter login
+
+    users.remember(user["id"], user["username"])
+    token = access_token(user["id"], user["username"])
     resp = jsonify({"ok": True})
     set_access_cookies(resp, token)
     return resp, 200
@@ -195,11 +495,12 @@ def login():
 @app.get("/api/me")
 @jwt_required()
 def me():
-    user_id = get_jwt_identity()  # string
-    rows = db.execute("SELECT id, username FROM users WHERE id = ?", int(user_id))
-    if len(rows) != 1:
+    user_id = int(get_jwt_identity())  # string in the token
+    # Tokens issued before the username claim existed fall back to the directory
+    username = get_jwt().get("username") or users.username(user_id)
+    if username is None:
         return jsonify({"ok": False, "error": "user not found"}), 404
-    return jsonify({"ok": True, "user": rows[0]}), 200
+    return jsonify({"ok": True, "user": {"id": user_id, "username": username}}), 200
 
 
 @app.post("/api/logout")
@@ -208,44 +509,57 @@ def logout():
     unset_jwt_cookies(resp)
     return resp, 200
 
+# Catalog bodies are tagged with the catalog version; a till that already
+# holds that version gets a 304 and no body
+def catalog_response(etag, make_body):
+    if request.if_none_match.contains(etag):
+        resp = app.response_class(status=304)
+    else:
+        resp = app.response_class(make_body(), mimetype="application/json")
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+
 @app.get("/api/products")
 @jwt_required()
 def get_products():
-    rows = db.execute("""
-        SELECT id, name, alias, category, list_price, image_url, is_active
-        FROM products
-        WHERE is_active = 1
-        ORDER BY name
-    """)
+    snap = catalog.snapshot()
 
-    # Convert snake_case DB -> camelCase JSON
-    products = [
-        {
-            "id": r["id"],
-            "name": r["name"],
-            "alias": r["alias"],
-            "category": r["category"],
-            "listPrice": r["list_price"],
-            "imageUrl": r["image_url"],
-            "isActive": bool(r["is_active"]),
-        }
-        for r in rows
-    ]
+    since_version = request.args.get("since_version")
+    if since_version is not None:
+        try:
+            since_version = int(since_version)
+        except ValueError:
+            return jsonify({"ok": False, "error": "invalid since_version"}), 400
+        return catalog_response(
+            f"products-{snap.version}-since-{since_version}",
+            lambda: snap.products_delta_json(since_version)
+        )
 
-    return jsonify({"products": products})
+    return catalog_response(f"products-{snap.version}", lambda: snap.products_json)
 
 
 @app.get("/api/payment-methods")
 @jwt_required()
 def get_payment_methods():
-    rows = db.execute("""
-        SELECT id, name
-        FROM payment_methods
-        WHERE is_active = 1
-        ORDER BY id
-    """)
-    methods = [{"id": r["id"], "name": r["name"]} for r in rows]
-    return jsonify({"methods": methods})
+    snap = catalog.snapshot()
+    return catalog_response(f"methods-{snap.version}", lambda: snap.methods_json)
+
+# ?stores= on the Z and product reports. Returns (results, error_response)
+# where results is {store: body} computed in parallel, one process per store.
+def run_store_reports(kind, date_range):
+    if store_reports is None:
+        return None, (jsonify({"ok": False, "error": "multi-store reports are not configured (POS_STORES)"}), 400)
+    try:
+        names = store_reports.resolve(request.args.get("stores"))
+    except StoreError as e:
+        return None, (jsonify({"ok": False, "error": str(e)}), 400)
+    try:
+        return store_reports.run(kind, names, date_range["start"], date_range["end"]), None
+    except StoreError as e:
+        return None, (jsonify({"ok": False, "error": str(e)}), 503)
+
 
 @app.get("/api/reports/z")
 @jwt_required()
@@ -257,51 +571,39 @@ def z_report():
     if error:
         return jsonify({"ok": False, "error": error}), 400
 
-    totals_row = db.execute(
-        """
-        SELECT
-            COUNT(*) AS orders_count,
-            COALESCE(SUM(subtotal_cents), 0) AS subtotal_cents,
-            COALESCE(SUM(total_paid_cents), 0) AS paid_cents,
-            COALESCE(SUM(change_cents), 0) AS change_cents
-        FROM orders
-        WHERE (status IS NULL OR status != 'void')
-          AND date(datetime(created_at, '-6 hours')) BETWEEN date(?) AND date(?)
-        """,
-        date_range["start"], date_range["end"]
-    )
-    totals = totals_row[0] if totals_row else {
-        "orders_count": 0, "subtotal_cents": 0, "paid_cents": 0, "change_cents": 0
-    }
+    if request.args.get("stores"):
+        results, error = run_store_reports("z", date_range)
+        if error:
+            return error
+        return jsonify({
+            "range": {"start": date_range["start"], "end": date_range["end"]},
+            "stores": list(results),
+            **merge_z(results.values()),
+            "by_store": [{"store": name, "totals": body["totals"]} for name, body in results.items()],
+        }), 200
+
+    # Closed days from their snapshots, today (and anything not closed) from the
+    # rollup. Days are closed by the close-days command, never by a report.
+    return jsonify({
+        "range": {"start": date_range["start"], "end": date_range["end"]},
+        **snapshot_z_totals(db, date_range["start"], date_range["end"]),
+    }), 200
 
-    payments = db.execute(
-        """
-        SELECT
-            pm.name AS method,
-            COALESCE(SUM(p.amount_cents), 0) AS amount_cents
-        FROM payments p
-        JOIN payment_methods pm ON pm.id = p.payment_method_id
-        JOIN orders o ON o.id = p.order_id
-        WHERE (o.status IS NULL OR o.status != 'void')
-          AND date(datetime(o.created_at, '-6 hours')) BETWEEN date(?) AND date(?)
-        GROUP BY pm.id, pm.name
-        ORDER BY pm.id
-        """,
-        date_range["start"], date_range["end"]
+
+@app.get("/api/reports/z/snapshots")
+@jwt_required()
+def z_snapshots():
+    date_range, error = resolve_date_range(
+        request.args.get("start_date"),
+        request.args.get("end_date")
     )
+    if error:
+        return jsonify({"ok": False, "error": error}), 400
 
+    # Audit view: every version of every closed day, superseded ones included
     return jsonify({
         "range": {"start": date_range["start"], "end": date_range["end"]},
-        "totals": {
-            "orders_count": int(totals["orders_count"]),
-            "subtotal_cents": int(totals["subtotal_cents"]),
-            "paid_cents": int(totals["paid_cents"]),
-            "change_cents": int(totals["change_cents"]),
-        },
-        "payments_by_method": [
-            {"method": r["method"], "amount_cents": int(r["amount_cents"])}
-            for r in payments
-        ],
+        "snapshots": snapshot_history(db, date_range["start"], date_range["end"]),
     }), 200
 
 @app.get("/api/reports/products")
@@ -314,38 +616,107 @@ def product_report():
     if error:
         return jsonify({"ok": False, "error": error}), 400
 
-    rows = db.execute(
-        """
+    if request.args.get("stores"):
+        results, error = run_store_reports("products", date_range)
+        if error:
+            return error
+        return jsonify({
+            "range": {"start": date_range["start"], "end": date_range["end"]},
+            "stores": list(results),
+            "rows": merge_products(results.values()),
+        }), 200
+
+    # Merges per-day partials from the product rollup
+    return jsonify({
+        "range": {"start": date_range["start"], "end": date_range["end"]},
+        "rows": product_totals(db, date_range["start"], date_range["end"]),
+    }), 200
+
+
+@app.get("/api/reports/hourly")
+@jwt_required()
+def hourly_report():
+    date_range, error = resolve_date_range(
+        request.args.get("start_date"),
+        request.args.get("end_date")
+    )
+    if error:
+        return jsonify({"ok": False, "error": error}), 400
+
+    bucket = (request.args.get("bucket") or "hour").lower()
+    if bucket == "hour":
+        bucket_sql = "hour"
+    elif bucket == "daypart":
+        cases = " ".join(f"WHEN hour >= {start} AND hour < {end} THEN '{name}'" for name, start, end in DAY_PARTS)
+        bucket_sql = f"CASE {cases} ELSE 'other' END"
+    else:
+        return jsonify({"ok": False, "error": "bucket must be hour or daypart"}), 400
+
+    # Served from the hourly rollup: a PK range scan of at most 24 rows per business day
+    totals = db.execute(
+        f"""
+        SELECT
+            {bucket_sql} AS bucket,
+            SUM(orders_count) AS orders_count,
+            SUM(subtotal_cents) AS subtotal_cents,
+            SUM(paid_cents) AS paid_cents,
+            SUM(change_cents) AS change_cents
+        FROM z_hourly
+        WHERE business_date BETWEEN ? AND ?
+        GROUP BY 1
+        HAVING SUM(orders_count) > 0
+        """,
+        date_range["start"], date_range["end"]
+    )
+
+    payments = db.execute(
+        f"""
         SELECT
-            ol.product_id,
-            ol.name,
-            ol.unit_price_cents,
-            SUM(ol.qty) AS qty,
-            SUM(ol.line_total_cents) AS total_cents
-        FROM order_lines ol
-        JOIN orders o ON o.id = ol.order_id
-        WHERE (o.status IS NULL OR o.status != 'void')
-          AND date(datetime(o.created_at, '-6 hours')) BETWEEN date(?) AND date(?)
-        GROUP BY ol.product_id, ol.name, ol.unit_price_cents
-        ORDER BY ol.name, ol.unit_price_cents DESC
+            {bucket_sql} AS bucket,
+            pm.name AS method,
+            SUM(z.amount_cents) AS amount_cents
+        FROM z_hourly_payments z
+        JOIN payment_methods pm ON pm.id = z.payment_method_id
+        WHERE z.business_date BETWEEN ? AND ?
+        GROUP BY 1, pm.id, pm.name
+        HAVING SUM(z.payments_count) > 0
+        ORDER BY pm.id
         """,
         date_range["start"], date_range["end"]
     )
+    methods_by_bucket = {}
+    for r in payments:
+        methods_by_bucket.setdefault(r["bucket"], []).append(
+            {"method": r["method"], "amount_cents": int(r["amount_cents"])}
+        )
+
+    order = [name for name, _, _ in DAY_PARTS] + ["other"]
+    totals.sort(key=lambda r: r["bucket"] if bucket == "hour" else order.index(r["bucket"]))
 
     return jsonify({
         "range": {"start": date_range["start"], "end": date_range["end"]},
-        "rows": [
+        "bucket": bucket,
+        "buckets": [
             {
-                "product_id": int(r["product_id"]),
-                "name": r["name"],
-                "unit_price_cents": int(r["unit_price_cents"]),
-                "qty": int(r["qty"]),
-                "total_cents": int(r["total_cents"]),
+                "bucket": r["bucket"],
+                "orders_count": int(r["orders_count"]),
+                "subtotal_cents": int(r["subtotal_cents"]),
+                "paid_cents": int(r["paid_cents"]),
+                "change_cents": int(r["change_cents"]),
+                "payments_by_method": methods_by_bucket.get(r["bucket"], []),
             }
-            for r in rows
+            for r in totals
         ],
     }), 200
 
+def order_missing(order_id):
+    # Not in the hot database: either archived (closed month, read-only) or unknown
+    for archive_db in archives.for_order(order_id):
+        if archive_db.execute("SELECT 1 FROM orders WHERE id = ?", order_id):
+            return jsonify({"ok": False, "error": "order is in an archived month"}), 400
+    return jsonify({"ok": False, "error": "order not found"}), 404
+
+
 @app.post("/api/orders/<int:order_id>/void")
 @jwt_required()
 def void_order(order_id):
@@ -354,14 +725,29 @@ def void_order(order_id):
 
     rows = db.execute("SELECT id, status FROM orders WHERE id = ?", order_id)
     if not rows:
-        return jsonify({"ok": False, "error": "order not found"}), 404
+        return order_missing(order_id)
     if rows[0]["status"] not in (None, "paid"):
         return jsonify({"ok": False, "error": "order not voidable"}), 400
 
-    db.execute(
-        "UPDATE orders SET status = 'void', voided_at = CURRENT_TIMESTAMP, void_reason = ? WHERE id = ?",
-        reason or None, order_id
-    )
+    try:
+        with db.transaction():
+            # Re-checked under the write lock so two tills can't void it twice
+            updated = db.execute(
+                """
+                UPDATE orders SET status = 'void', voided_at = CURRENT_TIMESTAMP, void_reason = ?
+                WHERE id = ? AND (status IS NULL OR status = 'paid')
+                """,
+                reason or None, order_id
+            )
+            if updated:
+                apply_order(db, order_id, -1)
+                record_change(db, "void", order_id)
+                order_detail_invalidations.publish(order_id)
+    except Exception:
+        return jsonify({"ok": False, "error": "database error"}), 500
+    order_detail_cache.invalidate(order_id)
+    if not updated:
+        return jsonify({"ok": False, "error": "order not voidable"}), 400
 
     order = db.execute(
         "SELECT id, status, voided_at, void_reason FROM orders WHERE id = ?",
@@ -381,13 +767,12 @@ def refund_order(order_id):
         order_id
     )
     if not rows:
-        return jsonify({"ok": False, "error": "order not found"}), 404
+        return order_missing(order_id)
     original = rows[0]
     if original["status"] not in (None, "paid"):
         return jsonify({"ok": False, "error": "order not refundable"}), 400
 
-    method_rows = db.execute("SELECT id FROM payment_methods WHERE is_active = 1")
-    valid_methods = {int(r["id"]) for r in method_rows}
+    valid_methods = catalog.snapshot().methods_by_id
 
     total_refund = 0
     cleaned_payments = []
@@ -408,51 +793,39 @@ def refund_order(order_id):
         return jsonify({"ok": False, "error": "refund must equal original subtotal"}), 400
 
     try:
-        db.execute("BEGIN")
-        refund_id = db.execute(
-            """
-            INSERT INTO orders (user_id, subtotal_cents, total_paid_cents, change_cents, status, original_order_id)
-            VALUES (?, ?, ?, 0, 'refund', ?)
-            """,
-            int(get_jwt_identity()), -original["subtotal_cents"], -total_refund, order_id
-        )
-
-        lines = db.execute(
-            """
-            SELECT product_id, name, qty, unit_price_cents, line_total_cents, comment
-            FROM order_lines WHERE order_id = ?
-            """,
-            order_id
-        )
-
-        for l in lines:
-            db.execute(
+        with db.transaction():
+            refund_id = db.execute(
                 """
-                INSERT INTO order_lines (order_id, product_id, name, qty, unit_price_cents, line_total_cents, comment)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
+                INSERT INTO orders (user_id, subtotal_cents, total_paid_cents, change_cents, status, original_order_id)
+                VALUES (?, ?, ?, 0, 'refund', ?)
                 """,
-                refund_id,
-                l["product_id"],
-                l["name"],
-                -int(l["qty"]),
-                int(l["unit_price_cents"]),
-                -int(l["line_total_cents"]),
-                l["comment"]
+                int(get_jwt_identity()), -original["subtotal_cents"], -total_refund, order_id
             )
 
-        for p in cleaned_payments:
+            # Negated copy of the original lines in one statement
             db.execute(
                 """
-                INSERT INTO payments (order_id, payment_method_id, amount_cents)
-                VALUES (?, ?, ?)
+                INSERT INTO order_lines (order_id, product_id, name, qty, unit_price_cents, line_total_cents, comment)
+                SELECT ?, product_id, name, -qty, unit_price_cents, -line_total_cents, comment
+                FROM order_lines
+                WHERE order_id = ?
+                ORDER BY id
                 """,
-                refund_id, p["method_id"], -p["amount_cents"]
+                refund_id, order_id
             )
 
-        db.execute("COMMIT")
+            db.executemany(
+                "INSERT INTO payments (order_id, payment_method_id, amount_cents) VALUES (?, ?, ?)",
+                [(refund_id, p["method_id"], -p["amount_cents"]) for p in cleaned_payments]
+            )
+
+            apply_order(db, refund_id)
+            index_order(db, refund_id)
+            record_change(db, "refund", refund_id)
+            order_detail_invalidations.publish(order_id)
     except Exception:
-        db.execute("ROLLBACK")
         return jsonify({"ok": False, "error": "database error"}), 500
+    order_detail_cache.invalidate(order_id)
 
     return jsonify({
         "ok": True,
@@ -461,6 +834,36 @@ def refund_order(order_id):
         "receipt_text": ""
     }), 200
 
+@app.get("/api/changes")
+@jwt_required()
+def list_changes():
+    # Change feed for downstream sync: pass the last seq you processed as since
+    try:
+        since = int(request.args.get("since") or 0)
+    except ValueError:
+        return jsonify({"ok": False, "error": "invalid since"}), 400
+    if since < 0:
+        return jsonify({"ok": False, "error": "invalid since"}), 400
+
+    try:
+        limit = int(request.args.get("limit") or CHANGES_PAGE_DEFAULT)
+    except ValueError:
+        return jsonify({"ok": False, "error": "invalid limit"}), 400
+    if limit <= 0:
+        return jsonify({"ok": False, "error": "invalid limit"}), 400
+    limit = min(limit, CHANGES_PAGE_MAX)
+
+    rows = changes_since(db, since, limit + 1)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    return jsonify({
+        "changes": rows,
+        "next_since": rows[-1]["seq"] if rows else since,
+        "has_more": has_more,
+    }), 200
+
+
 @app.get("/api/orders")
 @jwt_required()
 def list_orders():
@@ -473,12 +876,28 @@ def list_orders():
 
     status = (request.args.get("status") or "all").lower()
     q = (request.args.get("q") or "").strip()
+    include_total = (request.args.get("include_total") or "").lower() in ("1", "true")
 
-    params = [date_range["start"], date_range["end"]]
-    filters = ["date(datetime(o.created_at, '-6 hours')) BETWEEN date(?) AND date(?)"]
+    try:
+        limit = int(request.args.get("limit") or ORDERS_PAGE_DEFAULT)
+    except ValueError:
+        return jsonify({"ok": False, "error": "invalid limit"}), 400
+    if limit <= 0:
+        return jsonify({"ok": False, "error": "invalid limit"}), 400
+    limit = min(limit, ORDERS_PAGE_MAX)
+
+    after = None
+    if request.args.get("cursor"):
+        after, error = decode_cursor(request.args.get("cursor"))
+        if error:
+            return jsonify({"ok": False, "error": error}), 400
+
+    params = [date_range["start_ts"], date_range["end_ts_exclusive"]]
+    filters = ["o.created_at >= ?", "o.created_at < ?"]
 
     if status in ("paid", "void", "refund"):
-        filters.append("o.status = ?")
+        # Unary + keeps pages on idx_orders_created_at; idx_orders_status would read and sort every match in history
+        filters.append("+o.status = ?")
         params.append(status)
     elif status != "all":
         return jsonify({"ok": False, "error": "invalid status"}), 400
@@ -488,25 +907,61 @@ def list_orders():
             filters.append("o.id = ?")
             params.append(int(q))
         else:
-            filters.append("u.username LIKE ?")
-            params.append(f"%{q}%")
+            # Cashier, item names and comments through the full-text index
+            match = match_query(q)
+            filters.append("o.id IN (SELECT rowid FROM order_search WHERE order_search MATCH ?)" if match else "0")
+            if match:
+                params.append(match)
+
+    # Hot database first, then archived months in the range, newest first
+    sources = archives.sources(date_range["start_ts"], date_range["end_ts_exclusive"])
+
+    total = None
+    if include_total:
+        # Only counted on request; it is the one part that scales with the range
+        total = sum(
+            source.execute(
+                f"""
+                SELECT COUNT(*) AS n
+                FROM orders o
+                WHERE {" AND ".join(filters)}
+                """,
+                *params
+            )[0]["n"]
+            for source in sources
+        )
+
+    if after:
+        filters.append("(o.created_at < ? OR (o.created_at = ? AND o.id < ?))")
+        params.extend([after[0], after[0], after[1]])
 
     where_sql = " AND ".join(filters)
-    rows = db.execute(
-        f"""
-        SELECT
-            o.id, o.created_at, o.status, o.subtotal_cents, o.total_paid_cents,
-            o.change_cents, o.original_order_id, u.id AS user_id, u.username
-        FROM orders o
-        LEFT JOIN users u ON u.id = o.user_id
-        WHERE {where_sql}
-        ORDER BY o.created_at DESC
-        """,
-        *params
-    )
+    rows = []
+    for source in sources:
+        rows += source.execute(
+            f"""
+            SELECT
+                o.id, o.created_at, o.status, o.subtotal_cents, o.total_paid_cents,
+                o.change_cents, o.original_order_id, o.user_id
+            FROM orders o
+            WHERE {where_sql}
+            ORDER BY o.created_at DESC, o.id DESC
+            LIMIT ?
+            """,
+            *params, limit + 1 - len(rows)
+        )
+        if len(rows) > limit:
+            break
 
-    return jsonify({
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+
+    names = users.usernames(r["user_id"] for r in rows)
+    response = {
         "range": {"start": date_range["start"], "end": date_range["end"]},
+        "next_cursor": next_cursor,
         "orders": [
             {
                 "id": r["id"],
@@ -516,50 +971,170 @@ def list_orders():
                 "total_paid_cents": r["total_paid_cents"],
                 "change_cents": r["change_cents"],
                 "original_order_id": r["original_order_id"],
-                "user": {"id": r["user_id"], "username": r["username"]} if r["user_id"] else None,
+                "user": user_json(r["user_id"], names),
             }
             for r in rows
         ],
-    }), 200
+    }
+    if include_total:
+        response["total"] = int(total)
 
+    return jsonify(response), 200
 
-@app.get("/api/orders/<int:order_id>")
+
+# Month-end dumps for accounting. Each kind is one flat table; rows come in
+# (created_at, id) order so orders, lines and payments files line up.
+EXPORT_QUERIES = {
+    "orders": (
+        ["order_id", "created_at", "status", "user_id", "username", "subtotal_cents", "total_paid_cents",
+         "change_cents", "original_order_id", "voided_at", "void_reason"],
+        """
+        SELECT o.id AS order_id, o.created_at, o.status, o.user_id, o.subtotal_cents,
+               o.total_paid_cents, o.change_cents, o.original_order_id, o.voided_at, o.void_reason
+        FROM orders o
+        WHERE {where}
+        ORDER BY o.created_at, o.id
+        """,
+    ),
+    "lines": (
+        ["order_id", "created_at", "status", "line_id", "product_id", "name", "qty", "unit_price_cents",
+         "line_total_cents", "comment"],
+        """
+        SELECT o.id AS order_id, o.created_at, o.status, l.id AS line_id, l.product_id, l.name, l.qty,
+               l.unit_price_cents, l.line_total_cents, l.comment
+        FROM orders o
+        JOIN order_lines l ON l.order_id = o.id
+        WHERE {where}
+        ORDER BY o.created_at, o.id
+        """,
+    ),
+    "payments": (
+        ["order_id", "created_at", "status", "payment_id", "payment_method_id", "payment_method", "amount_cents"],
+        """
+        SELECT o.id AS order_id, o.created_at, o.status, p.id AS payment_id, p.payment_method_id,
+               pm.name AS payment_method, p.amount_cents
+        FROM orders o
+        JOIN payments p ON p.order_id = o.id
+        LEFT JOIN payment_methods pm ON pm.id = p.payment_method_id
+        WHERE {where}
+        ORDER BY o.created_at, o.id
+        """,
+    ),
+}
+
+
+@app.get("/api/orders/export")
 @jwt_required()
-def order_detail(order_id):
-    rows = db.execute(
+def export_orders():
+    date_range, error = resolve_date_range(
+        request.args.get("start_date"),
+        request.args.get("end_date")
+    )
+    if error:
+        return jsonify({"ok": False, "error": error}), 400
+
+    kind = (request.args.get("kind") or "orders").lower()
+    if kind not in EXPORT_QUERIES:
+        return jsonify({"ok": False, "error": "kind must be orders, lines or payments"}), 400
+    fmt = (request.args.get("format") or "csv").lower()
+    if fmt not in ("csv", "ndjson"):
+        return jsonify({"ok": False, "error": "format must be csv or ndjson"}), 400
+
+    params = [date_range["start_ts"], date_range["end_ts_exclusive"]]
+    filters = ["o.created_at >= ?", "o.created_at < ?"]
+    status = (request.args.get("status") or "all").lower()
+    if status in ("paid", "void", "refund"):
+        # Unary + keeps the planner on idx_orders_created_at; idx_orders_status would need a sort of every row
+        filters.append("+o.status = ?")
+        params.append(status)
+    elif status != "all":
+        return jsonify({"ok": False, "error": "invalid status"}), 400
+
+    columns, sql = EXPORT_QUERIES[kind]
+    sql = sql.format(where=" AND ".join(filters))
+    sources = archives.sources(date_range["start_ts"], date_range["end_ts_exclusive"])
+
+    def generate():
+        # One chunk in memory at a time, encoded and handed to the server as it is read
+        if fmt == "csv":
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            writer.writerow(columns)
+            yield buf.getvalue()
+        # Archived months oldest first, then the hot database
+        for source in reversed(sources):
+            for chunk in source.iterate(sql, *params, chunk_size=EXPORT_CHUNK_ROWS):
+                if "username" in columns:
+                    names = users.usernames(r["user_id"] for r in chunk)
+                    for r in chunk:
+                        r["username"] = names.get(r["user_id"])
+                if fmt == "csv":
+                    buf.seek(0)
+                    buf.truncate()
+                    writer.writerows([r[c] for c in columns] for r in chunk)
+                    yield buf.getvalue()
+                else:
+                    yield "".join(json.dumps(r, separators=(",", ":")) + "\n" for r in chunk)
+
+    filename = f"{kind}_{date_range['start']}_{date_range['end']}.{fmt}"
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/csv" if fmt == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+# Finalized orders only change status (void); reprints and lookups are served
+# from here and the void/refund routes drop the entry they touch, in this
+# process directly and in other worker processes through the invalidation log
+order_detail_cache = LRUCache(maxsize=ORDER_DETAIL_CACHE_SIZE)
+order_detail_invalidations = InvalidationLog(db, "order_detail")
+
+
+def drop_order_detail(key):
+    order_detail_cache.invalidate(int(key))
+
+
+def load_order_detail(order_id, source=db):
+    # Header, lines and payments in one round trip; json_group_array keeps
+    # index (insertion) order from idx_order_lines_order_id / idx_payments_order_id.
+    # source is the hot database or a monthly archive (same tables)
+    rows = source.execute(
         """
         SELECT
             o.id, o.created_at, o.status, o.subtotal_cents, o.total_paid_cents,
-            o.change_cents, o.original_order_id, u.id AS user_id, u.username
+            o.change_cents, o.original_order_id, o.user_id,
+            (
+                SELECT json_group_array(json_object(
+                    'name', ol.name,
+                    'qty', ol.qty,
+                    'unit_price_cents', ol.unit_price_cents,
+                    'line_total_cents', ol.line_total_cents,
+                    'comment', ol.comment
+                ))
+                FROM order_lines ol
+                WHERE ol.order_id = o.id
+            ) AS lines_json,
+            (
+                SELECT json_group_array(json_object(
+                    'payment_method_id', p.payment_method_id,
+                    'method_name', pm.name,
+                    'amount_cents', p.amount_cents
+                ))
+                FROM payments p
+                JOIN payment_methods pm ON pm.id = p.payment_method_id
+                WHERE p.order_id = o.id
+            ) AS payments_json
         FROM orders o
-        LEFT JOIN users u ON u.id = o.user_id
         WHERE o.id = ?
         """,
         order_id
     )
     if not rows:
-        return jsonify({"ok": False, "error": "order not found"}), 404
+        return None
 
     order = rows[0]
-    lines = db.execute(
-        """
-        SELECT name, qty, unit_price_cents, line_total_cents, comment
-        FROM order_lines
-        WHERE order_id = ?
-        """,
-        order_id
-    )
-    payments = db.execute(
-        """
-        SELECT p.payment_method_id, pm.name AS method_name, p.amount_cents
-        FROM payments p
-        JOIN payment_methods pm ON pm.id = p.payment_method_id
-        WHERE p.order_id = ?
-        """,
-        order_id
-    )
-
-    return jsonify({
+    return {
         "order": {
             "id": order["id"],
             "created_at": order["created_at"],
@@ -568,43 +1143,100 @@ def order_detail(order_id):
             "total_paid_cents": order["total_paid_cents"],
             "change_cents": order["change_cents"],
             "original_order_id": order["original_order_id"],
-            "user": {"id": order["user_id"], "username": order["username"]} if order["user_id"] else None,
+            "user": user_json(order["user_id"], users.usernames([order["user_id"]])),
         },
-        "lines": [
-            {
-                "name": l["name"],
-                "qty": l["qty"],
-                "unit_price_cents": l["unit_price_cents"],
-                "line_total_cents": l["line_total_cents"],
-                "comment": l["comment"],
-            }
-            for l in lines
-        ],
-        "payments": [
-            {
-                "payment_method_id": p["payment_method_id"],
-                "method_name": p["method_name"],
-                "amount_cents": p["amount_cents"],
-            }
-            for p in payments
-        ],
-    }), 200
+        "lines": json.loads(order["lines_json"]),
+        "payments": json.loads(order["payments_json"]),
+    }
 
-@app.post("/api/orders")
+
+@app.get("/api/orders/<int:order_id>")
 @jwt_required()
-def create_order():
-    data = request.get_json(silent=True) or {}
+def order_detail(order_id):
+    order_detail_invalidations.poll(drop_order_detail)
+    payload = order_detail_cache.get(order_id)
+    if payload is None:
+        seen = order_detail_invalidations.mark()
+        payload = load_order_detail(order_id)
+        if payload is None:
+            for archive_db in archives.for_order(order_id):
+                payload = load_order_detail(order_id, archive_db)
+                if payload is not None:
+                    break
+        if payload is None:
+            return jsonify({"ok": False, "error": "order not found"}), 404
+        order_detail_cache.put(order_id, payload)
+        # A void or refund that committed during the load may already have been
+        # polled past by another thread; it is found here. Anything committed
+        # later is published after the put, so the next poll drops the entry.
+        if order_detail_invalidations.published_since(order_id, seen):
+            order_detail_cache.invalidate(order_id)
+
+    return jsonify(payload), 200
+
+
+# Writes one validated order inside the caller's transaction: one prepared
+# batch per table, with created_at stamped here so it never needs reading back.
+# Offline replays pass the original sale time and their idempotency key.
+def insert_order(user_id, cleaned, created_at=None, client_ref=None):
+    created_at = created_at or datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+    lines = cleaned["lines"]
+    payments = cleaned["payments"]
+
+    order_id = db.execute(
+        """
+        INSERT INTO orders (user_id, subtotal_cents, total_paid_cents, change_cents, created_at, client_ref)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        user_id, cleaned["subtotal_cents"], cleaned["total_paid_cents"], cleaned["change_cents"], created_at, client_ref
+    )
+
+    db.executemany(
+        """
+        INSERT INTO order_lines (order_id, product_id, name, qty, unit_price_cents, line_total_cents, comment)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        [
+            (order_id, l["product_id"], l["name"], l["qty"], l["unit_price_cents"], l["line_total_cents"], l["comment"] or None)
+            for l in lines
+        ]
+    )
+
+    db.executemany(
+        "INSERT INTO payments (order_id, payment_method_id, amount_cents) VALUES (?, ?, ?)",
+        [(order_id, p["method_id"], p["amount_cents"]) for p in payments]
+    )
+
+    apply_order(db, order_id)
+    index_order(db, order_id)
+    record_change(db, "sale", order_id)
+    return order_id, created_at
+
+
+# Optional group commit: checkout orders are queued to one writer thread that
+# commits up to POS_GROUP_COMMIT_MAX_BATCH of them per transaction, waiting at
+# most POS_GROUP_COMMIT_MAX_WAIT_MS to fill a batch
+order_writer = None
+if os.environ.get("POS_GROUP_COMMIT") == "1":
+    order_writer = GroupCommitWriter(
+        db,
+        insert_order,
+        max_batch=int(os.environ.get("POS_GROUP_COMMIT_MAX_BATCH", "64")),
+        max_wait_ms=float(os.environ.get("POS_GROUP_COMMIT_MAX_WAIT_MS", "0")),
+    )
+
+
+# Same rules for live checkout and offline replays. Returns (ok, error, cleaned)
+# where cleaned holds lines, payments and subtotal/paid/change totals.
+# replay: an offline order checked against the catalog as of now, not as of
+# its sale. The till's list price and a product deactivated since are accepted.
+def validate_order(data, snap, replay=False):
     raw_lines = data.get("lines") or []
     raw_payments = data.get("payments") or []
+    methods = snap.methods_by_id
 
     if not raw_lines:
-        return jsonify({"ok": False, "error": "no order lines"}), 400
-
-    user_id = int(get_jwt_identity())
-
-    # Load payment methods for validation
-    method_rows = db.execute("SELECT id, name FROM payment_methods WHERE is_active = 1")
-    methods = {int(r["id"]): r["name"] for r in method_rows}
+        return False, "no order lines", None
 
     cleaned_lines = []
     subtotal_cents = 0
@@ -614,12 +1246,26 @@ def create_order():
             name = (l.get("name") or "").strip()
             qty = int(l.get("qty") or 0)
             unit_price_cents = int(l.get("priceCents") or l.get("listPriceCents") or 0)
+            list_price_cents = l.get("listPriceCents")
+            list_price_cents = int(list_price_cents) if list_price_cents is not None else None
             comment = (l.get("comment") or "").strip()
         except Exception:
-            return jsonify({"ok": False, "error": "invalid line item"}), 400
+            return False, "invalid line item", None
 
         if product_id <= 0 or not name or qty <= 0 or unit_price_cents < 0:
-            return jsonify({"ok": False, "error": "invalid line item"}), 400
+            return False, "invalid line item", None
+
+        # Checked against the cached catalog; price overrides stay allowed,
+        # but the list price the till based them on must be current
+        if replay:
+            if product_id not in snap.known_product_ids:
+                return False, "product not found", None
+        else:
+            product = snap.products_by_id.get(product_id)
+            if product is None:
+                return False, "product not found", None
+            if list_price_cents is not None and list_price_cents != product["price_cents"]:
+                return False, "list price changed, reload products", None
 
         line_total_cents = qty * unit_price_cents
         subtotal_cents += line_total_cents
@@ -639,12 +1285,12 @@ def create_order():
             method_id = int(p.get("methodId") or 0)
             amount_cents = int(p.get("amountCents") or 0)
         except Exception:
-            return jsonify({"ok": False, "error": "invalid payment"}), 400
+            return False, "invalid payment", None
 
         if method_id <= 0 or amount_cents < 0:
-            return jsonify({"ok": False, "error": "invalid payment"}), 400
+            return False, "invalid payment", None
         if method_id not in methods:
-            return jsonify({"ok": False, "error": "payment method not found"}), 400
+            return False, "payment method not found", None
 
         total_paid_cents += amount_cents
         if amount_cents > 0:
@@ -655,52 +1301,48 @@ def create_order():
             })
 
     if total_paid_cents < subtotal_cents:
-        return jsonify({"ok": False, "error": "insufficient payment"}), 400
+        return False, "insufficient payment", None
+
+    return True, None, {
+        "lines": cleaned_lines,
+        "payments": cleaned_payments,
+        "subtotal_cents": subtotal_cents,
+        "total_paid_cents": total_paid_cents,
+        "change_cents": max(0, total_paid_cents - subtotal_cents),
+    }
 
-    change_cents = max(0, total_paid_cents - subtotal_cents)
 
-    try:
-        db.execute("BEGIN")
-        order_id = db.execute(
-            "INSERT INTO orders (user_id, subtotal_cents, total_paid_cents, change_cents) VALUES (?, ?, ?, ?)",
-            user_id, subtotal_cents, total_paid_cents, change_cents
-        )
+@app.post("/api/orders")
+@jwt_required()
+def create_order():
+    data = request.get_json(silent=True) or {}
 
-        for l in cleaned_lines:
-            db.execute(
-                """
-                INSERT INTO order_lines (order_id, product_id, name, qty, unit_price_cents, line_total_cents, comment)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-                """,
-                order_id, l["product_id"], l["name"], l["qty"], l["unit_price_cents"], l["line_total_cents"], l["comment"] or None
-            )
+    ok, error, cleaned = validate_order(data, catalog.snapshot())
+    if not ok:
+        return jsonify({"ok": False, "error": error}), 400
 
-        for p in cleaned_payments:
-            db.execute(
-                """
-                INSERT INTO payments (order_id, payment_method_id, amount_cents)
-                VALUES (?, ?, ?)
-                """,
-                order_id, p["method_id"], p["amount_cents"]
-            )
+    user_id = int(get_jwt_identity())
+    subtotal_cents = cleaned["subtotal_cents"]
+    total_paid_cents = cleaned["total_paid_cents"]
+    change_cents = cleaned["change_cents"]
+    cleaned_lines = cleaned["lines"]
+    cleaned_payments = cleaned["payments"]
 
-        db.execute("COMMIT")
+    try:
+        if order_writer is not None:
+            order_id, created_at = order_writer.submit(user_id, cleaned).result()
+        else:
+            with db.transaction():
+                order_id, created_at = insert_order(user_id, cleaned)
     except Exception:
-        db.execute("ROLLBACK")
         return jsonify({"ok": False, "error": "database error"}), 500
 
-    order_row = db.execute(
-        "SELECT id, subtotal_cents, total_paid_cents, change_cents, created_at FROM orders WHERE id = ?",
-        order_id
-    )
-    order = order_row[0] if order_row else None
-
     response = {
         "id": order_id,
         "subtotalCents": subtotal_cents,
         "totalPaidCents": total_paid_cents,
         "changeCents": change_cents,
-        "createdAt": order["created_at"] if order else None,
+        "createdAt": created_at,
         "status": "paid",
         "lines": [
             {
@@ -728,5 +1370,109 @@ def create_order():
     return jsonify({"ok": True, "order": response}), 200
 
 
+@app.post("/api/orders/batch")
+@jwt_required()
+def create_orders_batch():
+    data = request.get_json(silent=True) or {}
+    raw_orders = data.get("orders") or []
+
+    if not isinstance(raw_orders, list) or not raw_orders:
+        return jsonify({"ok": False, "error": "no orders"}), 400
+    if len(raw_orders) > ORDER_BATCH_MAX:
+        return jsonify({"ok": False, "error": f"at most {ORDER_BATCH_MAX} orders per batch"}), 400
+
+    user_id = int(get_jwt_identity())
+    snap = catalog.snapshot()
+    closed_before = archives.archived_before()
+    now = datetime.utcnow()
+    newest = (now + timedelta(seconds=REPLAY_CLOCK_SKEW_SECONDS)).strftime("%Y-%m-%d %H:%M:%S")
+    oldest = (now - timedelta(days=REPLAY_WINDOW_DAYS)).strftime("%Y-%m-%d %H:%M:%S")
+
+    # Validate everything up front; invalid orders are reported, not fatal
+    results = []
+    accepted = []
+    for raw in raw_orders:
+        raw = raw if isinstance(raw, dict) else {}
+        client_ref = str(raw.get("clientRef") or "").strip()
+        created_at = raw.get("createdAt")
+        result = {"clientRef": client_ref or None}
+        results.append(result)
+
+        if not client_ref:
+            result.update(ok=False, error="missing clientRef")
+            continue
+        if created_at is not None:
+            try:
+                created_at = datetime.strptime(str(created_at), "%Y-%m-%d %H:%M:%S").strftime("%Y-%m-%d %H:%M:%S")
+            except ValueError:
+                result.update(ok=False, error="invalid createdAt")
+                continue
+            if created_at > newest:
+                result.update(ok=False, error="createdAt is in the future")
+                continue
+            if created_at < oldest:
+                result.update(ok=False, error=f"createdAt is more than {REPLAY_WINDOW_DAYS} days old")
+                continue
+            if closed_before and created_at < closed_before:
+                result.update(ok=False, error="createdAt is in an archived month")
+                continue
+
+        ok, error, cleaned = validate_order(raw, snap, replay=True)
+        if not ok:
+            result.update(ok=False, error=error)
+            continue
+        accepted.append((result, client_ref, created_at, cleaned))
+
+    try:
+        with db.transaction():
+            # Checked under the write lock, so concurrent replays can't race
+            refs = [client_ref for _, client_ref, _, _ in accepted]
+            existing = {}
+            for i in range(0, len(refs), 500):
+                chunk = refs[i:i + 500]
+                rows = db.execute(
+                    f"SELECT id, client_ref FROM orders WHERE client_ref IN ({', '.join(['?'] * len(chunk))})",
+                    *chunk
+                )
+                existing.update({r["client_ref"]: r["id"] for r in rows})
+
+            for result, client_ref, created_at, cleaned in accepted:
+                if client_ref in existing:
+                    result.update(ok=True, id=existing[client_ref], duplicate=True)
+                    continue
+                order_id, created_at = insert_order(user_id, cleaned, created_at, client_ref)
+                existing[client_ref] = order_id
+                result.update(ok=True, id=order_id, duplicate=False, createdAt=created_at)
+    except Exception:
+        return jsonify({"ok": False, "error": "database error"}), 500
+
+    return jsonify({
+        "ok": True,
+        "created": sum(1 for r in results if r.get("ok") and not r.get("duplicate")),
+        "duplicates": sum(1 for r in results if r.get("duplicate")),
+        "rejected": sum(1 for r in results if not r.get("ok")),
+        "results": results,
+    }), 200
+
+
+# Number of most recent orders whose detail a new worker loads before serving
+ORDER_DETAIL_WARM = int(os.environ.get("POS_ORDER_CACHE_WARM", "200"))
+
+
+def warm_up(connections=4):
+    # Called by each pre-forked worker (gunicorn.conf.py) before it accepts
+    # requests, so the first tills after a restart don't pay for cold caches
+    db.warm(connections)
+    if store_reports is not None:
+        store_reports.start()
+    catalog.snapshot()
+    users.load_all()
+    for r in db.execute("SELECT id FROM orders ORDER BY id DESC LIMIT ?", ORDER_DETAIL_WARM):
+        payload = load_order_detail(r["id"])
+        if payload is not None:
+            order_detail_cache.put(r["id"], payload)
+    db.release()
+
+
 if __name__ == "__main__":
     app.run(debug=True, port=5000)
@@ -0,0 +1,258 @@
+# Monthly order archives.
+#
+# Closed business months of orders / order_lines / payments (and their
+# order_search rows) move out of the hot database into one SQLite file per
+# month (orders-YYYY-MM.db under the archive directory), registered in the hot table archive_months. Report
+# rollups stay in the hot database, so reports never open an archive;
+# history, detail and export read the hot database plus whichever archives
+# overlap the request. Archived months are closed: their orders can no
+# longer be voided or refunded, and offline syncs can't backdate into them.
+import os
+import re
+import threading
+from datetime import date, datetime, timedelta
+
+from database import Database
+from search import init_search
+
+ARCHIVED_TABLES = ("orders", "order_lines", "payments")
+# Copied whole so archived payments still resolve method names on their own
+REFERENCE_TABLES = ("payment_methods",)
+# Full-text rows (rowid = order id) move with their orders so q= still finds them
+SEARCH_TABLE = "order_search"
+ARCHIVE_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders(created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_order_lines_order_id ON order_lines(order_id)",
+    "CREATE INDEX IF NOT EXISTS idx_payments_order_id ON payments(order_id)",
+)
+
+# Business day is local time (UTC-6); created_at is stored in UTC
+BUSINESS_DAY_OFFSET = timedelta(hours=6)
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def init_archive(db):
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS archive_months (
+            month TEXT PRIMARY KEY,
+            file TEXT NOT NULL,
+            start_ts TEXT NOT NULL,
+            end_ts TEXT NOT NULL,
+            min_order_id INTEGER,
+            max_order_id INTEGER,
+            orders_count INTEGER NOT NULL,
+            archived_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def archived_before(db):
+    """
+    Returns: UTC end of the newest archived month (every hot order is at or after it), or None.
+    """
+    rows = db.execute("SELECT MAX(end_ts) AS end_ts FROM archive_months")
+    return rows[0]["end_ts"] if rows else None
+
+
+def month_bounds(month):
+    """
+    Returns: (start_ts, end_ts_exclusive) UTC strings covering business month "YYYY-MM".
+    """
+    first = datetime.strptime(month, "%Y-%m")
+    following = datetime(first.year + first.month // 12, first.month % 12 + 1, 1)
+    fmt = "%Y-%m-%d %H:%M:%S"
+    return (first + BUSINESS_DAY_OFFSET).strftime(fmt), (following + BUSINESS_DAY_OFFSET).strftime(fmt)
+
+
+def month_cutoff(keep_months=0):
+    """
+    Returns: the business month ("YYYY-MM") keep_months before the current one;
+    every month before it has fully ended. keep_months=0 is the current month.
+    """
+    today = (datetime.utcnow() - BUSINESS_DAY_OFFSET).date()
+    year, month = today.year, today.month - keep_months
+    while month <= 0:
+        year, month = year - 1, month + 12
+    return date(year, month, 1).strftime("%Y-%m")
+
+
+class Archives:
+    def __init__(self, db, directory):
+        self.db = db
+        self.directory = directory
+        self._open = {}  # file -> Database
+        self._lock = threading.Lock()
+
+    def months(self):
+        """
+        Returns: archive_months rows, newest month first.
+        """
+        return self.db.execute("SELECT * FROM archive_months ORDER BY month DESC")
+
+    def archived_before(self):
+        return archived_before(self.db)
+
+    def database(self, file):
+        with self._lock:
+            archive_db = self._open.get(file)
+            if archive_db is None:
+                archive_db = Database(os.path.join(self.directory, file), pool_size=2)
+                archive_db.observer = self.db.observer
+                self._ensure_search(archive_db)
+                self._open[file] = archive_db
+            return archive_db
+
+    def _ensure_search(self, archive_db):
+        # Archives written before order_search existed get their index on first open
+        if archive_db.execute("SELECT 1 FROM sqlite_master WHERE name = ?", SEARCH_TABLE):
+            return
+        conn = archive_db.connection()
+        conn.execute("ATTACH DATABASE ? AS hot", (self.db.path,))
+        try:
+            init_search(archive_db, users_table="hot.users")
+        finally:
+            conn.execute("DETACH DATABASE hot")
+
+    def release(self):
+        # Request teardown: hand back any archive connections this thread used
+        for archive_db in list(self._open.values()):
+            archive_db.release()
+
+    def sources(self, start_ts=None, end_ts=None):
+        """
+        Returns: the hot database, then every archive overlapping [start_ts, end_ts),
+        newest first. Months are disjoint and all older than the hot rows, so
+        reading sources in this order yields rows in created_at DESC order.
+        """
+        sources = [self.db]
+        for m in self.months():
+            if (end_ts is None or m["start_ts"] < end_ts) and (start_ts is None or m["end_ts"] > start_ts):
+                sources.append(self.database(m["file"]))
+        return sources
+
+    def for_order(self, order_id):
+        """
+        Returns: archives whose id range could contain order_id (usually one).
+        """
+        rows = self.db.execute(
+            "SELECT file FROM archive_months WHERE ? BETWEEN min_order_id AND max_order_id ORDER BY month DESC",
+            order_id
+        )
+        return [self.database(r["file"]) for r in rows]
+
+    def closed_months(self, keep_months=3):
+        """
+        Returns: months ("YYYY-MM") with hot orders that ended more than
+        keep_months full months before the current business month, oldest first.
+        """
+        cutoff = month_cutoff(keep_months)
+        rows = self.db.execute(
+            """
+            SELECT DISTINCT strftime('%Y-%m', created_at, '-6 hours') AS month
+            FROM orders
+            WHERE created_at < ?
+            ORDER BY 1
+            """,
+            month_bounds(cutoff)[0]
+        )
+        return [r["month"] for r in rows]
+
+    def archive_month(self, month):
+        """
+        Moves one business month of orders, lines and payments to its archive file.
+        Returns: number of orders moved.
+        """
+        start_ts, end_ts = month_bounds(month)
+        # An open month still takes checkouts, voids and offline replays
+        if end_ts > month_bounds(month_cutoff())[0]:
+            raise ArchiveError(f"{month} has not ended yet")
+        if self.db.execute("SELECT 1 FROM archive_months WHERE month = ?", month):
+            raise ArchiveError(f"{month} is already archived")
+        # Archives must stay a prefix of history so sources() stays time-ordered
+        if self.db.execute("SELECT 1 FROM orders WHERE created_at < ? LIMIT 1", start_ts):
+            raise ArchiveError(f"older months must be archived before {month}")
+
+        os.makedirs(self.directory, exist_ok=True)
+        file = f"orders-{month}.db"
+        path = os.path.join(self.directory, file)
+        # Left over from an interrupted run that never registered the month
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+        conn = self.db.connection()
+        schema = {
+            r["name"]: r["sql"]
+            for r in self.db.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name IN (?, ?, ?, ?, ?)",
+                *ARCHIVED_TABLES, *REFERENCE_TABLES, SEARCH_TABLE
+            )
+        }
+        in_month = "SELECT id FROM main.orders WHERE created_at >= ? AND created_at < ?"
+
+        conn.execute("ATTACH DATABASE ? AS arc", (path,))
+        try:
+            for table in ARCHIVED_TABLES + REFERENCE_TABLES + (SEARCH_TABLE,):
+                conn.execute(re.sub(r'^CREATE (VIRTUAL )?TABLE\s+"?\w+"?', rf"CREATE \1TABLE arc.{table}", schema[table], count=1))
+            for index in ARCHIVE_INDEXES:
+                conn.execute(index.replace("IF NOT EXISTS ", "IF NOT EXISTS arc.", 1))
+
+            # 1) Copy and commit the archive file first. The write lock holds off
+            #    voids while the month is read.
+            with self.db.transaction():
+                conn.execute(
+                    "INSERT INTO arc.orders SELECT * FROM main.orders WHERE created_at >= ? AND created_at < ?",
+                    (start_ts, end_ts)
+                )
+                for table in ("order_lines", "payments"):
+                    conn.execute(
+                        f"INSERT INTO arc.{table} SELECT * FROM main.{table} WHERE order_id IN ({in_month})",
+                        (start_ts, end_ts)
+                    )
+                for table in REFERENCE_TABLES:
+                    conn.execute(f"INSERT INTO arc.{table} SELECT * FROM main.{table}")
+                # SELECT * on an FTS table leaves out rowid, so name it
+                conn.execute(
+                    f"""
+                    INSERT INTO arc.{SEARCH_TABLE} (rowid, order_ref, username, items)
+                    SELECT rowid, order_ref, username, items FROM main.{SEARCH_TABLE} WHERE rowid IN ({in_month})
+                    """,
+                    (start_ts, end_ts)
+                )
+
+            # 2) Only then drop the hot rows and register the month. A void that
+            #    slipped in between shows up as a difference and aborts.
+            with self.db.transaction():
+                changed = conn.execute(
+                    f"""
+                    SELECT COUNT(*) AS n FROM (
+                        SELECT * FROM main.orders WHERE created_at >= ? AND created_at < ?
+                        EXCEPT
+                        SELECT * FROM arc.orders
+                    )
+                    """,
+                    (start_ts, end_ts)
+                ).fetchone()["n"]
+                if changed:
+                    raise ArchiveError(f"{month} changed while archiving; run again")
+
+                stats = conn.execute(
+                    "SELECT COUNT(*) AS n, MIN(id) AS min_id, MAX(id) AS max_id FROM arc.orders"
+                ).fetchone()
+                for table in ("payments", "order_lines"):
+                    conn.execute(f"DELETE FROM main.{table} WHERE order_id IN ({in_month})", (start_ts, end_ts))
+                conn.execute(f"DELETE FROM main.{SEARCH_TABLE} WHERE rowid IN ({in_month})", (start_ts, end_ts))
+                conn.execute("DELETE FROM main.orders WHERE created_at >= ? AND created_at < ?", (start_ts, end_ts))
+                conn.execute(
+                    """
+                    INSERT INTO archive_months (month, file, start_ts, end_ts, min_order_id, max_order_id, orders_count)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (month, file, start_ts, end_ts, stats["min_id"], stats["max_id"], stats["n"])
+                )
+        finally:
+            conn.execute("DETACH DATABASE arc")
+        return stats["n"]
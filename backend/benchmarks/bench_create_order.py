@@ -0,0 +1,76 @@
+"""
+POST /api/orders latency against order size.
+
+    python backend/benchmarks/bench_create_order.py --lines 1,10,50,100,200 --requests 200 [--json]
+
+Runs in-process through the Flask test client against a throwaway database,
+so the numbers are server-side cost only (no network).
+"""
+import argparse
+import json
+import time
+
+from common import load_app, products, summarize
+
+
+def order_payload(catalog, line_count):
+    lines = []
+    subtotal = 0
+    for i in range(line_count):
+        p = catalog[i % len(catalog)]
+        lines.append({
+            "productId": p["id"],
+            "name": p["name"],
+            "qty": 1 + i % 3,
+            "priceCents": p["price_cents"],
+            "listPriceCents": p["price_cents"],
+            "comment": "bench" if i % 5 == 0 else "",
+        })
+        subtotal += (1 + i % 3) * p["price_cents"]
+    return {
+        "lines": lines,
+        "payments": [
+            {"methodId": 3, "amountCents": subtotal // 2},
+            {"methodId": 1, "amountCents": subtotal - subtotal // 2 + 500},
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", default="1,10,50,100,200")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    _, client, db_path = load_app()
+    catalog = products(db_path)
+
+    results = []
+    for line_count in [int(n) for n in args.lines.split(",")]:
+        payload = order_payload(catalog, line_count)
+        for _ in range(args.warmup):
+            client.post("/api/orders", json=payload)
+
+        samples = []
+        for _ in range(args.requests):
+            t0 = time.perf_counter()
+            resp = client.post("/api/orders", json=payload)
+            samples.append((time.perf_counter() - t0) * 1000)
+            if resp.status_code != 200:
+                raise RuntimeError(resp.get_json())
+
+        results.append({"route": "POST /api/orders", "lines": line_count, **summarize(samples)})
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'lines':>6} {'p50 ms':>9} {'p99 ms':>9}")
+    for r in results:
+        print(f"{r['lines']:>6} {r['p50_ms']:>9.2f} {r['p99_ms']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+POST /api/orders throughput with and without group commit.
+
+    python backend/benchmarks/bench_group_commit.py --clients 1,8,32 --orders 200 [--synchronous FULL] [--json]
+
+Each client is a thread with its own logged-in test client posting small
+orders back to back. Group commit is switched on by swapping in a
+GroupCommitWriter, exactly as POS_GROUP_COMMIT=1 does at startup.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+from common import load_app, login, products, summarize
+
+
+def run(app_module, catalog, clients, orders_per_client):
+    p = catalog[0]
+    payload = {
+        "lines": [{"productId": p["id"], "name": p["name"], "qty": 1, "priceCents": p["price_cents"]}],
+        "payments": [{"methodId": 1, "amountCents": p["price_cents"]}],
+    }
+    test_clients = [login(app_module.app) for _ in range(clients)]
+    samples = [[] for _ in range(clients)]
+    errors = []
+    start = threading.Barrier(clients + 1)
+
+    def worker(i):
+        start.wait()
+        for _ in range(orders_per_client):
+            t0 = time.perf_counter()
+            resp = test_clients[i].post("/api/orders", json=payload)
+            samples[i].append((time.perf_counter() - t0) * 1000)
+            if resp.status_code != 200:
+                errors.append(resp.get_json())
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    start.wait()
+    t0 = time.perf_counter()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    if errors:
+        raise RuntimeError(errors[:3])
+    all_samples = [s for per_client in samples for s in per_client]
+    return summarize(all_samples, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", default="1,8,32")
+    parser.add_argument("--orders", type=int, default=200, help="orders per client")
+    parser.add_argument("--synchronous", default="FULL", help="SQLite synchronous pragma (FULL fsyncs each commit)")
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=0.0)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    os.environ["POS_SQLITE_SYNCHRONOUS"] = args.synchronous
+    app_module, _, db_path = load_app()
+    catalog = products(db_path)
+    group_writer = app_module.GroupCommitWriter(
+        app_module.db, app_module.insert_order, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms
+    )
+
+    results = []
+    for mode, writer in (("per-request commit", None), ("group commit", group_writer)):
+        app_module.order_writer = writer
+        for clients in [int(n) for n in args.clients.split(",")]:
+            stats = run(app_module, catalog, clients, args.orders)
+            results.append({"route": "POST /api/orders", "mode": mode, "clients": clients, **stats})
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'mode':<20} {'clients':>7} {'orders/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for r in results:
+        print(f"{r['mode']:<20} {r['clients']:>7} {r['throughput_rps']:>9.1f} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+    if group_writer.batches:
+        print(f"group commit: {group_writer.writes} orders in {group_writer.batches} transactions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Latency and throughput of every /api route against a (seeded) database.
+
+    python backend/benchmarks/bench_routes.py --db /tmp/pos-year.db --requests 50 --out results.json
+    python backend/benchmarks/bench_routes.py --db /tmp/pos-year.db --baseline results.json
+
+Requests go through the Flask test client, so numbers are server-side cost.
+Without --db a small fresh database is used. Results are JSON (one record
+per scenario, plus run metadata) so runs from two versions can be compared
+with --baseline.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import time
+from datetime import datetime, timedelta
+
+from common import BACKEND_DIR, load_app, products, summarize
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def scenarios(client, db_path, rng):
+    """
+    Yields (name, method, make_request) where make_request() -> (path, kwargs).
+    """
+    con = sqlite3.connect(db_path)
+    max_id = con.execute("SELECT COALESCE(MAX(id), 0) FROM orders").fetchone()[0]
+    con.close()
+    catalog = products(db_path)
+
+    today = (datetime.utcnow() - timedelta(hours=6)).date()
+    ranges = {
+        "day": (today, today),
+        "month": (today - timedelta(days=29), today),
+        "year": (today - timedelta(days=364), today),
+    }
+
+    def fixed(path):
+        return lambda: (path, {})
+
+    yield "GET /api/me", "GET", fixed("/api/me")
+    yield "GET /api/products", "GET", fixed("/api/products")
+    yield "GET /api/payment-methods", "GET", fixed("/api/payment-methods")
+
+    for label, (start, end) in ranges.items():
+        qs = f"start_date={start}&end_date={end}"
+        yield f"GET /api/reports/z [{label}]", "GET", fixed(f"/api/reports/z?{qs}")
+        yield f"GET /api/reports/products [{label}]", "GET", fixed(f"/api/reports/products?{qs}")
+        yield f"GET /api/reports/hourly [{label}]", "GET", fixed(f"/api/reports/hourly?{qs}")
+        yield f"GET /api/orders [{label}, first page]", "GET", fixed(f"/api/orders?{qs}&limit=100")
+
+    # Deep page: walk the cursor a few pages into the month, then time that page
+    start, end = ranges["month"]
+    qs = f"start_date={start}&end_date={end}&limit=100"
+    cursor = None
+    for _ in range(20):
+        data = client.get(f"/api/orders?{qs}" + (f"&cursor={cursor}" if cursor else "")).get_json() or {}
+        cursor = data.get("next_cursor") or cursor
+        if not data.get("next_cursor"):
+            break
+    if cursor:
+        yield "GET /api/orders [month, page 20]", "GET", fixed(f"/api/orders?{qs}&cursor={cursor}")
+    yield "GET /api/orders [month, q=username]", "GET", fixed(f"/api/orders?{qs}&q=ana")
+
+    if max_id:
+        yield "GET /api/orders/<id> [random]", "GET", lambda: (f"/api/orders/{rng.randint(1, max_id)}", {})
+        yield "GET /api/orders/<id> [repeat]", "GET", fixed(f"/api/orders/{max_id}")
+
+    def new_order():
+        picks = rng.sample(catalog, min(3, len(catalog)))
+        total = sum(p["price_cents"] for p in picks)
+        return "/api/orders", {"json": {
+            "lines": [{"productId": p["id"], "name": p["name"], "qty": 1, "priceCents": p["price_cents"]} for p in picks],
+            "payments": [{"methodId": 1, "amountCents": total}],
+        }}
+    yield "POST /api/orders", "POST", new_order
+
+
+def run_scenario(client, method, make_request, requests, warmup):
+    call = client.get if method == "GET" else client.post
+    for _ in range(warmup):
+        path, kwargs = make_request()
+        call(path, **kwargs)
+
+    samples = []
+    t_start = time.perf_counter()
+    for _ in range(requests):
+        path, kwargs = make_request()
+        t0 = time.perf_counter()
+        resp = call(path, **kwargs)
+        samples.append((time.perf_counter() - t0) * 1000)
+        if resp.status_code >= 400:
+            raise RuntimeError(f"{method} {path}: {resp.status_code} {resp.get_json()}")
+    return summarize(samples, time.perf_counter() - t_start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", help="seeded database (see seed.py); default: fresh empty one")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--only", help="run scenarios whose name contains this text")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", help="write JSON results to this file")
+    parser.add_argument("--baseline", help="earlier JSON results to compare p50/p99 against")
+    args = parser.parse_args()
+
+    app_module, client, db_path = load_app(args.db)
+    rng = random.Random(args.seed)
+
+    results = []
+    for name, method, make_request in scenarios(client, db_path, rng):
+        if args.only and args.only not in name:
+            continue
+        stats = run_scenario(client, method, make_request, args.requests, args.warmup)
+        results.append({"scenario": name, **stats})
+        print(f"{name:<45} p50 {stats['p50_ms']:>9.2f}  p95 {stats['p95_ms']:>9.2f}  "
+              f"p99 {stats['p99_ms']:>9.2f} ms  {stats['throughput_rps']:>8.1f} req/s")
+
+    report = {
+        "meta": {
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "db": os.path.abspath(db_path),
+            "db_size_bytes": os.path.getsize(db_path),
+            "requests": args.requests,
+            "timestamp": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+        },
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            before = {r["scenario"]: r for r in json.load(f)["results"]}
+        print(f"\n{'scenario':<45} {'p50 before':>11} {'p50 now':>9} {'p99 before':>11} {'p99 now':>9}")
+        for r in results:
+            b = before.get(r["scenario"])
+            if b:
+                print(f"{r['scenario']:<45} {b['p50_ms']:>11.2f} {r['p50_ms']:>9.2f} {b['p99_ms']:>11.2f} {r['p99_ms']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# Shared setup for the benchmark scripts: builds a throwaway pos.db from
+# schema.sql + products.csv (or uses a seeded one), imports the app against
+# it and logs a user in.
+import csv
+import os
+import sqlite3
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def create_database(path):
+    con = sqlite3.connect(path)
+    with open(os.path.join(BACKEND_DIR, "schema.sql")) as f:
+        con.executescript(f.read())
+
+    con.executemany(
+        "INSERT INTO payment_methods (code, name) VALUES (?, ?)",
+        [("cash", "Cash"), ("deposit", "Deposit"), ("card", "Card")]
+    )
+
+    with open(os.path.join(BACKEND_DIR, "products.csv"), newline="") as f:
+        con.executemany(
+            """
+            INSERT INTO products (id, name, alias, category, list_price, image_url, is_active)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (int(r["id"]), r["name"], r["alias"], r["category"], float(r["list_price"]), r["image_url"], int(r["is_active"]))
+                for r in csv.DictReader(f)
+            ]
+        )
+
+    con.commit()
+    con.close()
+
+
+def load_app(db_path=None):
+    """
+    Returns: (app module, logged-in Flask test client, db_path)
+    Without db_path a fresh database is built in a temp dir. The app picks
+    the file up through POS_DB_PATH when it is imported.
+    """
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix="pos-bench-"), "pos.db")
+        create_database(db_path)
+    os.environ["POS_DB_PATH"] = os.path.abspath(db_path)
+
+    sys.path.insert(0, BACKEND_DIR)
+    import app as app_module
+
+    client = login(app_module.app)
+    return app_module, client, db_path
+
+
+def login(flask_app, username="bench", password="bench"):
+    client = flask_app.test_client()
+    client.post("/api/register", json={"username": username, "password": password, "confirmation": password})
+    resp = client.post("/api/login", json={"username": username, "password": password})
+    if resp.status_code != 200:
+        raise RuntimeError(f"login failed: {resp.get_json()}")
+    return client
+
+
+def products(db_path):
+    con = sqlite3.connect(db_path)
+    rows = con.execute("SELECT id, name, list_price FROM products WHERE is_active = 1 ORDER BY id").fetchall()
+    con.close()
+    return [{"id": r[0], "name": r[1], "price_cents": int(round(float(r[2]) * 100))} for r in rows]
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[k]
+
+
+def summarize(samples_ms, elapsed_s=None):
+    out = {
+        "count": len(samples_ms),
+        "p50_ms": round(percentile(samples_ms, 50), 3),
+        "p95_ms": round(percentile(samples_ms, 95), 3),
+        "p99_ms": round(percentile(samples_ms, 99), 3),
+        "max_ms": round(max(samples_ms), 3) if samples_ms else 0.0,
+    }
+    if elapsed_s:
+        out["throughput_rps"] = round(len(samples_ms) / elapsed_s, 1)
+    return out
@@ -0,0 +1,178 @@
+"""
+Seeded synthetic POS history for benchmarking.
+
+    python backend/benchmarks/seed.py --db /tmp/pos-year.db --days 365 --orders-per-day 3000 [--seed 42]
+
+Fills the schema with orders spread over store hours (UTC-6 business days
+ending today), 1-8 lines each, cash/card/split payments, and a mix of voids
+and refunds. Rows are written straight through sqlite3 in large batches;
+the app is then opened once on the file so init_db adds its indexes and
+builds the report rollups from the raw rows.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
+from common import BACKEND_DIR, create_database, products
+
+CASHIERS = ["ana", "beto", "carla", "diego", "elena", "fer", "gaby", "hugo"]
+COMMENTS = ["no onions", "extra ice", "to go", "no sauce", "well done", "gluten free"]
+# Orders per local hour of the day (weights), breakfast/lunch/dinner peaks
+HOUR_WEIGHTS = {7: 3, 8: 6, 9: 5, 10: 3, 11: 5, 12: 9, 13: 10, 14: 7, 15: 3, 16: 3, 17: 4, 18: 7, 19: 8, 20: 6, 21: 3}
+CHUNK = 20000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", required=True, help="database file to create (must not exist)")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--orders-per-day", type=int, default=3000)
+    parser.add_argument("--void-rate", type=float, default=0.02)
+    parser.add_argument("--refund-rate", type=float, default=0.01)
+    parser.add_argument("--split-rate", type=float, default=0.15, help="share of orders paid with two methods")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        sys.exit(f"{args.db} already exists")
+
+    rng = random.Random(args.seed)
+    create_database(args.db)
+    catalog = products(args.db)
+
+    con = sqlite3.connect(args.db, isolation_level=None)
+    con.execute("PRAGMA journal_mode = WAL")
+    con.execute("PRAGMA synchronous = OFF")
+
+    # Every cashier shares the benchmark login password
+    pw_hash = generate_password_hash("bench")
+    con.executemany(
+        "INSERT INTO users (username, hash) VALUES (?, ?)",
+        [(name, pw_hash) for name in CASHIERS + ["bench"]]
+    )
+    user_ids = [r[0] for r in con.execute("SELECT id FROM users WHERE username != 'bench'")]
+
+    hours = list(HOUR_WEIGHTS)
+    hour_weights = list(HOUR_WEIGHTS.values())
+    today = (datetime.utcnow() - timedelta(hours=6)).date()
+    first_day = today - timedelta(days=args.days - 1)
+
+    t0 = time.time()
+    order_id = 0
+    orders, lines, payments = [], [], []
+    refunds = []  # (original id, user, created_at) written after the originals
+
+    def flush():
+        con.execute("BEGIN")
+        con.executemany(
+            """
+            INSERT INTO orders (id, user_id, subtotal_cents, total_paid_cents, change_cents, created_at,
+                                status, voided_at, void_reason, original_order_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            orders
+        )
+        con.executemany(
+            """
+            INSERT INTO order_lines (order_id, product_id, name, qty, unit_price_cents, line_total_cents, comment)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            lines
+        )
+        con.executemany("INSERT INTO payments (order_id, payment_method_id, amount_cents) VALUES (?, ?, ?)", payments)
+        con.execute("COMMIT")
+        orders.clear()
+        lines.clear()
+        payments.clear()
+
+    for day_offset in range(args.days):
+        business_day = first_day + timedelta(days=day_offset)
+        count = max(1, int(rng.gauss(args.orders_per_day, args.orders_per_day * 0.1)))
+        stamps = sorted(
+            datetime(business_day.year, business_day.month, business_day.day, rng.choices(hours, hour_weights)[0])
+            + timedelta(hours=6, seconds=rng.randrange(3600))
+            for _ in range(count)
+        )
+
+        for stamp in stamps:
+            order_id += 1
+            created_at = stamp.strftime("%Y-%m-%d %H:%M:%S")
+            user_id = rng.choice(user_ids)
+
+            subtotal = 0
+            for product in rng.sample(catalog, min(len(catalog), rng.randint(1, 8))):
+                qty = rng.choice((1, 1, 1, 2, 2, 3))
+                price = product["price_cents"] if rng.random() > 0.03 else product["price_cents"] // 2
+                comment = rng.choice(COMMENTS) if rng.random() < 0.1 else None
+                lines.append((order_id, product["id"], product["name"], qty, price, qty * price, comment))
+                subtotal += qty * price
+
+            if rng.random() < args.split_rate:
+                card = rng.randrange(0, subtotal + 1)
+                paid = [(3, card), (1, subtotal - card)]
+            elif rng.random() < 0.5:
+                paid = [(1, subtotal + rng.choice((0, 0, 500, 1000, 5000)))]
+            else:
+                paid = [(3, subtotal)]
+            paid = [(m, a) for m, a in paid if a > 0]
+            total_paid = sum(a for _, a in paid)
+            payments.extend((order_id, m, a) for m, a in paid)
+
+            status, voided_at, void_reason = "paid", None, None
+            roll = rng.random()
+            if roll < args.void_rate:
+                status, voided_at, void_reason = "void", created_at, "seeded void"
+            elif roll < args.void_rate + args.refund_rate:
+                refund_at = (stamp + timedelta(minutes=rng.randint(5, 240))).strftime("%Y-%m-%d %H:%M:%S")
+                refunds.append((order_id, user_id, refund_at))
+
+            orders.append((order_id, user_id, subtotal, total_paid, max(0, total_paid - subtotal), created_at,
+                           status, voided_at, void_reason, None))
+            if len(orders) >= CHUNK:
+                flush()
+    flush()
+
+    # Refunds mirror the original: negated lines, cash back for the subtotal
+    con.execute("BEGIN")
+    for original_id, user_id, refund_at in refunds:
+        subtotal = con.execute("SELECT subtotal_cents FROM orders WHERE id = ?", (original_id,)).fetchone()[0]
+        cur = con.execute(
+            """
+            INSERT INTO orders (user_id, subtotal_cents, total_paid_cents, change_cents, created_at, status, original_order_id)
+            VALUES (?, ?, ?, 0, ?, 'refund', ?)
+            """,
+            (user_id, -subtotal, -subtotal, refund_at, original_id)
+        )
+        con.execute(
+            """
+            INSERT INTO order_lines (order_id, product_id, name, qty, unit_price_cents, line_total_cents, comment)
+            SELECT ?, product_id, name, -qty, unit_price_cents, -line_total_cents, comment
+            FROM order_lines WHERE order_id = ?
+            """,
+            (cur.lastrowid, original_id)
+        )
+        if subtotal:
+            con.execute(
+                "INSERT INTO payments (order_id, payment_method_id, amount_cents) VALUES (?, 1, ?)",
+                (cur.lastrowid, -subtotal)
+            )
+    con.execute("COMMIT")
+    con.close()
+    print(f"inserted {order_id} orders and {len(refunds)} refunds in {time.time() - t0:.1f}s", file=sys.stderr)
+
+    # Opening the app runs init_db: indexes, catalog triggers, rollup backfill
+    t0 = time.time()
+    os.environ["POS_DB_PATH"] = os.path.abspath(args.db)
+    sys.path.insert(0, BACKEND_DIR)
+    import app  # noqa: F401
+    print(f"schema bootstrap and rollups in {time.time() - t0:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
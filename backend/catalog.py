@@ -0,0 +1,181 @@
+# Versioned in-process cache of the sellable catalog (active products and
+# payment methods).
+#
+# Triggers bump catalog_version on any change to products/payment_methods,
+# including edits made outside the app (sqlite3 shell, CSV imports). The
+# cache re-reads that one-row table at most every `refresh_seconds` and
+# reloads only when the version moved; invalidate() forces a reload.
+import json
+import threading
+import time
+
+
+def init_catalog(db):
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS catalog_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    """)
+    db.execute("INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 1)")
+
+    # Per-product change version, so tills can ask for "changed since N"
+    db.ensure_column("products", "catalog_version", "INTEGER NOT NULL DEFAULT 0")
+
+    # Hard deletes are rare (products are deactivated), but delta clients must hear about them
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS catalog_deletions (
+            product_id INTEGER PRIMARY KEY,
+            catalog_version INTEGER NOT NULL
+        )
+    """)
+
+    # Dropped and recreated whenever create_schema() runs, so a changed definition
+    # reaches existing databases once app.SCHEMA_VERSION is bumped
+    bump = "UPDATE catalog_version SET version = version + 1 WHERE id = 1;"
+    current = "(SELECT version FROM catalog_version WHERE id = 1)"
+    triggers = {
+        "trg_products_insert_version": f"""
+            AFTER INSERT ON products
+            BEGIN
+                {bump}
+                UPDATE products SET catalog_version = {current} WHERE id = NEW.id;
+                DELETE FROM catalog_deletions WHERE product_id = NEW.id;
+            END
+        """,
+        "trg_products_update_version": f"""
+            AFTER UPDATE ON products
+            WHEN NEW.catalog_version = OLD.catalog_version
+            BEGIN
+                {bump}
+                UPDATE products SET catalog_version = {current} WHERE id = NEW.id;
+            END
+        """,
+        "trg_products_delete_version": f"""
+            AFTER DELETE ON products
+            BEGIN
+                {bump}
+                INSERT OR REPLACE INTO catalog_deletions (product_id, catalog_version) VALUES (OLD.id, {current});
+            END
+        """,
+    }
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        triggers[f"trg_payment_methods_{event.lower()}_version"] = f"""
+            AFTER {event} ON payment_methods
+            BEGIN
+                {bump}
+            END
+        """
+
+    for name, body in triggers.items():
+        db.execute(f"DROP TRIGGER IF EXISTS {name}")
+        db.execute(f"CREATE TRIGGER {name} {body}")
+
+
+def price_cents(list_price):
+    # list_price is stored in currency units (e.g. 18.0); the API speaks cents
+    return int(round(float(list_price or 0) * 100))
+
+
+def product_json(r):
+    return {
+        "id": r["id"],
+        "name": r["name"],
+        "alias": r["alias"],
+        "category": r["category"],
+        "listPrice": r["list_price"],
+        "imageUrl": r["image_url"],
+        "isActive": bool(r["is_active"]),
+    }
+
+
+class CatalogSnapshot:
+    def __init__(self, version, product_rows, method_rows, deletion_rows):
+        self.version = version
+
+        # product_rows includes inactive products so deltas can report deactivations
+        active_rows = [r for r in product_rows if r["is_active"]]
+        self.products = [product_json(r) for r in active_rows]
+        self.products_by_id = {
+            int(r["id"]): {"name": r["name"], "price_cents": price_cents(r["list_price"])}
+            for r in active_rows
+        }
+        # Offline replays may sell a product deactivated since
+        self.known_product_ids = {int(r["id"]) for r in product_rows}
+        self._changes = sorted(
+            ((int(r["catalog_version"]), product_json(r)) for r in product_rows),
+            key=lambda c: c[0]
+        )
+        self._deletions = [(int(r["catalog_version"]), int(r["product_id"])) for r in deletion_rows]
+
+        self.methods = [{"id": r["id"], "name": r["name"]} for r in method_rows]
+        self.methods_by_id = {int(r["id"]): r["name"] for r in method_rows}
+
+        # Pre-encoded response bodies; the catalog is read far more than it changes
+        self.products_json = json.dumps(
+            {"products": self.products, "version": version}, separators=(",", ":")
+        )
+        self.methods_json = json.dumps(
+            {"methods": self.methods, "version": version}, separators=(",", ":")
+        )
+
+    def products_delta_json(self, since_version):
+        """
+        Products added, changed or deactivated after since_version (inactive
+        ones come back with isActive false), plus ids hard-deleted since then.
+        """
+        changed = [p for v, p in self._changes if v > since_version]
+        removed = [product_id for v, product_id in self._deletions if v > since_version]
+        return json.dumps(
+            {"products": changed, "removed": removed, "version": self.version, "since_version": since_version},
+            separators=(",", ":")
+        )
+
+
+class Catalog:
+    def __init__(self, db, refresh_seconds=5.0):
+        self.db = db
+        self.refresh_seconds = refresh_seconds
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._checked_at = 0.0
+        self._snapshot = None
+
+    def snapshot(self):
+        snap = self._snapshot
+        if snap is not None and time.monotonic() - self._checked_at < self.refresh_seconds:
+            return snap
+
+        with self._lock:
+            snap = self._snapshot
+            if snap is not None and time.monotonic() - self._checked_at < self.refresh_seconds:
+                return snap
+
+            version = self._version()
+            if snap is None or snap.version != version:
+                snap = self._load(version)
+                self._snapshot = snap
+            self._checked_at = time.monotonic()
+            return snap
+
+    def _version(self):
+        rows = self.db.execute("SELECT version FROM catalog_version WHERE id = 1")
+        return int(rows[0]["version"]) if rows else 0
+
+    def _load(self, version):
+        product_rows = self.db.execute("""
+            SELECT id, name, alias, category, list_price, image_url, is_active, catalog_version
+            FROM products
+            ORDER BY name
+        """)
+        method_rows = self.db.execute("""
+            SELECT id, name
+            FROM payment_methods
+            WHERE is_active = 1
+            ORDER BY id
+        """)
+        deletion_rows = self.db.execute("SELECT product_id, catalog_version FROM catalog_deletions")
+        return CatalogSnapshot(version, product_rows, method_rows, deletion_rows)
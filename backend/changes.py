@@ -0,0 +1,82 @@
+# Sequenced change feed (GET /api/changes) for downstream sync.
+#
+# Every write that changes an order appends one row to change_log inside its
+# own transaction: "sale" (checkout and offline batch), "void" and "refund"
+# (order_id is the new refund order, related_order_id the original). Writers
+# are serialized by BEGIN IMMEDIATE, so seq values become visible in commit
+# order and a consumer that remembers the last seq it processed never skips
+# a change. Reading is a primary-key range from that seq, so its cost follows
+# new activity, not history size. Rows are kept forever (they are small) and
+# stay in the hot database when orders are archived.
+
+
+def init_changes(db):
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            event TEXT NOT NULL,
+            order_id INTEGER NOT NULL,
+            related_order_id INTEGER NULL,
+            amount_cents INTEGER NOT NULL,
+            business_date TEXT NOT NULL,
+            occurred_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    if db.execute("SELECT 1 FROM orders LIMIT 1") and not db.execute("SELECT 1 FROM change_log LIMIT 1"):
+        backfill_changes(db)
+
+
+def record_change(db, event, order_id):
+    """
+    Appends one change for order_id (already written). Must run inside the caller's transaction.
+    Returns: the change's seq.
+    """
+    return db.execute(
+        """
+        INSERT INTO change_log (event, order_id, related_order_id, amount_cents, business_date)
+        SELECT ?, id, original_order_id, subtotal_cents, date(created_at, '-6 hours')
+        FROM orders
+        WHERE id = ?
+        """,
+        event, order_id
+    )
+
+
+def backfill_changes(db):
+    # Existing hot orders in the order they happened: sales and refunds by
+    # creation, then voids by void time
+    with db.transaction():
+        db.execute("""
+            INSERT INTO change_log (event, order_id, related_order_id, amount_cents, business_date, occurred_at)
+            SELECT event, order_id, related_order_id, amount_cents, business_date, occurred_at
+            FROM (
+                SELECT
+                    CASE WHEN status = 'refund' THEN 'refund' ELSE 'sale' END AS event,
+                    id AS order_id, original_order_id AS related_order_id, subtotal_cents AS amount_cents,
+                    date(created_at, '-6 hours') AS business_date, created_at AS occurred_at
+                FROM orders
+                UNION ALL
+                SELECT
+                    'void', id, original_order_id, subtotal_cents,
+                    date(created_at, '-6 hours'), voided_at
+                FROM orders
+                WHERE status = 'void' AND voided_at IS NOT NULL
+            )
+            ORDER BY occurred_at, event = 'void', order_id
+        """)
+
+
+def changes_since(db, since, limit):
+    """
+    Returns: up to limit changes with seq > since, oldest first.
+    """
+    return db.execute(
+        """
+        SELECT seq, event, order_id, related_order_id, amount_cents, business_date, occurred_at
+        FROM change_log
+        WHERE seq > ?
+        ORDER BY seq
+        LIMIT ?
+        """,
+        since, limit
+    )
@@ -0,0 +1,203 @@
+# SQLite access layer.
+#
+# Drop-in for the cs50 SQL wrapper's execute() (SELECT -> list of dicts,
+# INSERT -> lastrowid, anything else -> rowcount), plus:
+# - one connection per thread/request, handed back to a small pool on release()
+# - WAL journal, tuned pragmas and sqlite3's per-connection statement cache
+#   (synchronous=NORMAL by default; FULL fsyncs every commit)
+# - real transactions via `with db.transaction():` (BEGIN IMMEDIATE, so
+#   writers queue on busy_timeout instead of failing on lock upgrade)
+# - an optional `observer` (see metrics.py) told about every statement and
+#   transaction; unset, execute() pays one attribute check
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+
+def _dict_row(cursor, row):
+    return {col[0]: value for col, value in zip(cursor.description, row)}
+
+
+class Database:
+    def __init__(self, path, pool_size=8, busy_timeout_ms=5000, cache_size_kib=16384, statement_cache=256,
+                 synchronous="NORMAL"):
+        self.path = path
+        self.synchronous = synchronous
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cache_size_kib = cache_size_kib
+        self.statement_cache = statement_cache
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._local = threading.local()
+        # observer.query(sql, seconds, rows, params, db), .lock_wait(seconds), .transaction(seconds);
+        # db is the Database that ran the statement (archives share the hot observer)
+        self.observer = None
+        # SQLite connections must not cross fork(); a pre-forked worker starts with none
+        os.register_at_fork(after_in_child=self._forget_connections)
+
+    def _forget_connections(self):
+        self._pool = queue.LifoQueue(maxsize=self._pool.maxsize)
+        self._local = threading.local()
+
+    def close_all(self):
+        """
+        Closes this thread's and every pooled connection (e.g. in a server's
+        master process before it forks workers).
+        """
+        self.release()
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def warm(self, connections):
+        """
+        Opens up to `connections` pooled connections ahead of the first requests.
+        """
+        opened = []
+        for _ in range(min(connections, self._pool.maxsize) - self._pool.qsize()):
+            opened.append(self._connect())
+        for conn in opened:
+            try:
+                self._pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            isolation_level=None,  # autocommit; transactions are explicit
+            check_same_thread=False,  # pooled connections move between threads
+            cached_statements=self.statement_cache,
+        )
+        conn.row_factory = _dict_row
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        conn.execute(f"PRAGMA cache_size = -{int(self.cache_size_kib)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            self._local.conn = conn
+            self._local.depth = 0
+        return conn
+
+    def release(self):
+        """
+        Returns this thread's connection to the pool (call at request teardown).
+        An unfinished transaction is rolled back first.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            return
+        self._local.conn = None
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def execute(self, sql, *args):
+        observer = self.observer
+        if observer is None:
+            return self._execute(sql, args)
+        started = time.perf_counter()
+        result = self._execute(sql, args)
+        rows = len(result) if isinstance(result, list) else self._local.rowcount
+        observer.query(sql, time.perf_counter() - started, rows, args, self)
+        return result
+
+    def iterate(self, sql, *args, chunk_size=1000):
+        """
+        Streams a SELECT through a server-side cursor instead of fetchall(),
+        so memory stays at one chunk however many rows match.
+        Returns: generator of lists (up to chunk_size) of dict rows.
+        """
+        started = time.perf_counter()
+        cursor = self.connection().execute(sql, args)
+        seconds, rows = time.perf_counter() - started, 0
+        try:
+            while True:
+                started = time.perf_counter()
+                batch = cursor.fetchmany(chunk_size)
+                seconds += time.perf_counter() - started
+                if not batch:
+                    break
+                rows += len(batch)
+                yield batch
+        finally:
+            cursor.close()
+            if self.observer is not None:
+                # Time spent inside SQLite only, not waiting on the consumer
+                self.observer.query(sql, seconds, rows, args, self)
+
+    def _execute(self, sql, args):
+        cursor = self.connection().execute(sql, args)
+        if cursor.description is not None:
+            return cursor.fetchall()
+        self._local.rowcount = cursor.rowcount
+        if sql.lstrip()[:6].upper() in ("INSERT", "REPLAC"):
+            return cursor.lastrowid
+        return cursor.rowcount
+
+    def ensure_column(self, table, column, declaration):
+        # Additive migration for databases created before the column existed
+        columns = {r["name"] for r in self.execute(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            self.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
+    def executemany(self, sql, seq_of_args):
+        observer = self.observer
+        if observer is None:
+            return self.connection().executemany(sql, seq_of_args).rowcount
+        started = time.perf_counter()
+        rowcount = self.connection().executemany(sql, seq_of_args).rowcount
+        observer.query(sql, time.perf_counter() - started, rowcount, None, self)
+        return rowcount
+
+    @contextmanager
+    def transaction(self):
+        """
+        Commits on success, rolls back on any exception (which is re-raised).
+        Nested use becomes a savepoint inside the outer transaction.
+        """
+        conn = self.connection()
+        depth = self._local.depth
+        name = f"sp_{depth}"
+        observer = self.observer if depth == 0 else None
+        if observer is not None:
+            # BEGIN IMMEDIATE blocks (up to busy_timeout) while another connection writes
+            started = time.perf_counter()
+            conn.execute("BEGIN IMMEDIATE")
+            locked = time.perf_counter()
+            observer.lock_wait(locked - started)
+        else:
+            conn.execute("BEGIN IMMEDIATE" if depth == 0 else f"SAVEPOINT {name}")
+        self._local.depth = depth + 1
+        try:
+            yield self
+        except BaseException:
+            if depth == 0:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+            else:
+                conn.execute(f"ROLLBACK TO {name}")
+                conn.execute(f"RELEASE {name}")
+            raise
+        else:
+            conn.execute("COMMIT" if depth == 0 else f"RELEASE {name}")
+        finally:
+            self._local.depth = depth
+            if observer is not None:
+                observer.transaction(time.perf_counter() - locked)
@@ -0,0 +1,80 @@
+# Group commit for checkout writes.
+#
+# Request threads hand validated orders to one writer thread and wait on a
+# Future. The writer drains the queue into batches (up to max_batch orders,
+# waiting at most max_wait_ms for stragglers; with the default of 0 a batch is
+# whatever queued up while the previous one committed) and commits each
+# batch as one transaction, so a lunch rush pays for one commit/fsync per
+# batch rather than per order. Each order runs in its own savepoint: a bad order fails
+# only its own Future, and every Future completes only after COMMIT.
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class GroupCommitWriter:
+    def __init__(self, db, write_one, max_batch=64, max_wait_ms=0.0):
+        self.db = db
+        self.write_one = write_one
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.batches = 0
+        self.writes = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, *args):
+        """
+        Queues write_one(*args) for the next batch.
+        Returns: Future resolving to write_one's result once committed.
+        """
+        self._ensure_started()
+        future = Future()
+        self._queue.put((future, args))
+        return future
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="group-commit-writer", daemon=True)
+                self._thread.start()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            outcomes = []
+            try:
+                with self.db.transaction():
+                    for future, args in batch:
+                        try:
+                            with self.db.transaction():
+                                outcomes.append((future, True, self.write_one(*args)))
+                        except Exception as e:
+                            outcomes.append((future, False, e))
+            except Exception as e:
+                for future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.writes += len(batch)
+            for future, ok, value in outcomes:
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
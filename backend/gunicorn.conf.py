@@ -0,0 +1,36 @@
+# Production serving: pre-forked gunicorn workers sharing pos.db.
+#
+#     cd backend && gunicorn -c gunicorn.conf.py app:app
+#
+# The master imports the app once (preload_app), which runs the versioned
+# schema bootstrap a single time and then closes its SQLite connections so
+# none are inherited across fork. Each worker warms its pool, catalog, user
+# directory and recent order details before it accepts connections. WAL mode
+# lets workers read concurrently; writers queue on BEGIN IMMEDIATE.
+import multiprocessing
+import os
+import time
+
+bind = os.environ.get("POS_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("POS_WORKERS", multiprocessing.cpu_count()))
+worker_class = "gthread"
+threads = int(os.environ.get("POS_THREADS", "4"))
+preload_app = True
+timeout = 30
+graceful_timeout = 20
+keepalive = 5
+accesslog = os.environ.get("POS_ACCESS_LOG", "-")
+
+
+def when_ready(server):
+    # Master, after the preloaded import and before the first fork
+    import app
+    app.db.close_all()
+
+
+def post_worker_init(worker):
+    # Worker, after fork and before its accept loop starts
+    import app
+    started = time.perf_counter()
+    app.warm_up(connections=threads)
+    worker.log.info("worker %s warmed in %.0f ms", worker.pid, (time.perf_counter() - started) * 1000)
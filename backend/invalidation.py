@@ -0,0 +1,72 @@
+# Cross-process cache invalidation through the shared database.
+#
+# Every worker process keeps its own in-process caches. A write that makes a
+# cached entry stale publishes the key to cache_invalidations inside its own
+# transaction; each process reads rows newer than the last one it saw (a
+# primary-key range read that is empty almost every time) before serving
+# from its cache, and drops those keys locally.
+import threading
+
+
+def init_invalidation(db):
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS cache_invalidations (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            channel TEXT NOT NULL,
+            cache_key TEXT NOT NULL
+        )
+    """)
+
+
+class InvalidationLog:
+    def __init__(self, db, channel, keep=10000):
+        self.db = db
+        self.channel = channel
+        self.keep = keep
+        self._lock = threading.Lock()
+        # Caches start empty, so only invalidations from now on matter
+        rows = db.execute("SELECT COALESCE(MAX(seq), 0) AS seq FROM cache_invalidations")
+        self._seen = rows[0]["seq"]
+
+    def publish(self, key):
+        """
+        Records that key is stale for every process. Call inside the write's transaction.
+        """
+        seq = self.db.execute(
+            "INSERT INTO cache_invalidations (channel, cache_key) VALUES (?, ?)",
+            self.channel, str(key)
+        )
+        if seq % 1000 == 0:
+            self.db.execute("DELETE FROM cache_invalidations WHERE seq <= ?", seq - self.keep)
+
+    def mark(self):
+        """
+        Returns: the newest seq this process has polled; pass it to
+        published_since() after loading something to cache.
+        """
+        with self._lock:
+            return self._seen
+
+    def published_since(self, key, seq):
+        """
+        Returns: True when key was published (by any process) after seq.
+        """
+        return bool(self.db.execute(
+            "SELECT 1 FROM cache_invalidations WHERE seq > ? AND channel = ? AND cache_key = ? LIMIT 1",
+            seq, self.channel, str(key)
+        ))
+
+    def poll(self, drop):
+        """
+        Calls drop(key) for every key published (by any process) since the last poll.
+        """
+        rows = self.db.execute(
+            "SELECT seq, cache_key FROM cache_invalidations WHERE seq > ? AND channel = ? ORDER BY seq",
+            self._seen, self.channel
+        )
+        if not rows:
+            return
+        for r in rows:
+            drop(r["cache_key"])
+        with self._lock:
+            self._seen = max(self._seen, rows[-1]["seq"])
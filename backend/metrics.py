@@ -0,0 +1,158 @@
+# In-process latency metrics, rendered in Prometheus text format.
+#
+# Recording is a perf_counter() pair, a bisect and a few additions under a
+# lock; nothing is formatted until GET /api/metrics is scraped. Collected:
+# - per-route request latency, and the share of it spent in SQL
+# - per-statement latency and row counts (SQL text normalized to a label)
+# - write-lock wait (BEGIN IMMEDIATE) and transaction hold time
+import bisect
+import re
+import threading
+from functools import lru_cache
+
+# Seconds; covers a cached catalog hit up to a lock stuck on busy_timeout
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+@lru_cache(maxsize=1024)
+def statement_label(sql):
+    """
+    Returns: sql with whitespace collapsed and placeholder lists folded, so
+    chunked `IN (?, ?, ...)` lookups share one series.
+    """
+    text = " ".join(sql.split())
+    text = re.sub(r"\?(\s*,\s*\?)+", "?, ...", text)
+    return text if len(text) <= 200 else text[:197] + "..."
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    return ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+
+    def render(self, name, labels):
+        sep = "," if labels else ""
+        cumulative = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}'
+        cumulative += self.counts[-1]
+        yield f'{name}_bucket{{{labels}{sep}le="+Inf"}} {cumulative}'
+        suffix = f"{{{labels}}}" if labels else ""
+        yield f"{name}_sum{suffix} {self.total:.6f}"
+        yield f"{name}_count{suffix} {cumulative}"
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._requests = {}     # (method, route, status) -> Histogram
+        self._request_db = {}   # (method, route) -> Histogram
+        self._queries = {}      # statement label -> Histogram
+        self._query_rows = {}   # statement label -> rows returned/affected
+        self._lock_wait = Histogram()
+        self._transactions = Histogram()
+        self._collectors = []   # callables returning extra exposition lines
+
+    def add_collector(self, collect):
+        self._collectors.append(collect)
+
+    # --- Database observer interface
+    def query(self, sql, seconds, rows, params, db=None):
+        label = statement_label(sql)
+        self._local.db_seconds = getattr(self._local, "db_seconds", 0.0) + seconds
+        with self._lock:
+            hist = self._queries.get(label)
+            if hist is None:
+                hist = self._queries[label] = Histogram()
+                self._query_rows[label] = 0
+            hist.observe(seconds)
+            self._query_rows[label] += max(rows or 0, 0)
+
+    def lock_wait(self, seconds):
+        with self._lock:
+            self._lock_wait.observe(seconds)
+
+    def transaction(self, seconds):
+        with self._lock:
+            self._transactions.observe(seconds)
+
+    # --- Request hooks
+    def request_started(self):
+        self._local.db_seconds = 0.0
+
+    def request_finished(self, method, route, status, seconds):
+        db_seconds = getattr(self._local, "db_seconds", 0.0)
+        with self._lock:
+            key = (method, route, status)
+            hist = self._requests.get(key)
+            if hist is None:
+                hist = self._requests[key] = Histogram()
+            hist.observe(seconds)
+            hist = self._request_db.get((method, route))
+            if hist is None:
+                hist = self._request_db[(method, route)] = Histogram()
+            hist.observe(db_seconds)
+
+    def render(self):
+        """
+        Returns: every series in Prometheus text exposition format (0.0.4).
+        """
+        with self._lock:
+            lines = [
+                "# HELP pos_http_request_duration_seconds Request latency by route.",
+                "# TYPE pos_http_request_duration_seconds histogram",
+            ]
+            for key, hist in sorted(self._requests.items()):
+                lines.extend(hist.render(
+                    "pos_http_request_duration_seconds", _labels(("method", "route", "status"), key)
+                ))
+
+            lines += [
+                "# HELP pos_http_request_db_seconds Time each request spent executing SQL.",
+                "# TYPE pos_http_request_db_seconds histogram",
+            ]
+            for key, hist in sorted(self._request_db.items()):
+                lines.extend(hist.render("pos_http_request_db_seconds", _labels(("method", "route"), key)))
+
+            lines += [
+                "# HELP pos_db_query_duration_seconds Statement latency by normalized SQL.",
+                "# TYPE pos_db_query_duration_seconds histogram",
+            ]
+            for label, hist in sorted(self._queries.items()):
+                lines.extend(hist.render("pos_db_query_duration_seconds", _labels(("statement",), (label,))))
+
+            lines += [
+                "# HELP pos_db_query_rows_total Rows returned or affected by normalized SQL.",
+                "# TYPE pos_db_query_rows_total counter",
+            ]
+            for label, rows in sorted(self._query_rows.items()):
+                lines.append(f"pos_db_query_rows_total{{{_labels(('statement',), (label,))}}} {rows}")
+
+            lines += [
+                "# HELP pos_db_lock_wait_seconds Wait for the write lock (BEGIN IMMEDIATE).",
+                "# TYPE pos_db_lock_wait_seconds histogram",
+            ]
+            lines.extend(self._lock_wait.render("pos_db_lock_wait_seconds", ""))
+
+            lines += [
+                "# HELP pos_db_transaction_seconds Time from acquiring the write lock to COMMIT/ROLLBACK.",
+                "# TYPE pos_db_transaction_seconds histogram",
+            ]
+            lines.extend(self._transactions.render("pos_db_transaction_seconds", ""))
+        for collect in self._collectors:
+            lines.extend(collect())
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,91 @@
+# Password hashing off the request threads.
+#
+# Key derivation (scrypt/pbkdf2) is slow on purpose. Login and register hand
+# it to a small fixed pool, so a shift-change burst of logins occupies at
+# most `workers` cores; hashlib drops the GIL while deriving. The request
+# thread still waits for its hash, so at most `max_in_flight` hashes (queued +
+# running) are accepted at once; past that the route answers 503. Keep it
+# below the server's request threads so checkout always has a thread left.
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from metrics import Histogram
+
+
+class HasherBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    def __init__(self, workers=2, max_in_flight=3, method=None):
+        self.method = method  # werkzeug method string, e.g. "scrypt:32768:8:1"; None = werkzeug default
+        # Hashes store the fully expanded method ("scrypt" -> "scrypt:32768:8:1"); learn it once
+        self._prefix = generate_password_hash("", method).split("$", 1)[0] + "$" if method else None
+        self.max_in_flight = max(max_in_flight, 1)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self._pending = 0  # submitted and not finished (queued + running)
+        self._workers = workers
+        self._hash_time = Histogram()
+        self._wait_time = Histogram()
+
+    def hash(self, password):
+        """
+        Returns: a new hash of password using the configured method.
+        """
+        if self.method:
+            return self._run(generate_password_hash, password, self.method)
+        return self._run(generate_password_hash, password)
+
+    def verify(self, pw_hash, password):
+        return self._run(check_password_hash, pw_hash, password)
+
+    def needs_rehash(self, pw_hash):
+        # Stored hashes keep the method they were made with; upgrade on next login
+        return self._prefix is not None and not pw_hash.startswith(self._prefix)
+
+    def queue_depth(self):
+        return max(self._pending - self._workers, 0)
+
+    def _run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_in_flight:
+                raise HasherBusy()
+            self._pending += 1
+        submitted = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self._pending -= 1
+                    self._wait_time.observe(started - submitted)
+                    self._hash_time.observe(finished - started)
+
+        return self._executor.submit(timed).result()
+
+    def metric_lines(self):
+        """
+        Returns: Prometheus text lines for queue depth, wait and hash time.
+        """
+        with self._lock:
+            lines = [
+                "# HELP pos_password_hash_queue_depth Password hashes waiting for a worker.",
+                "# TYPE pos_password_hash_queue_depth gauge",
+                f"pos_password_hash_queue_depth {self.queue_depth()}",
+                "# HELP pos_password_hash_wait_seconds Time a hash waited for a worker.",
+                "# TYPE pos_password_hash_wait_seconds histogram",
+            ]
+            lines.extend(self._wait_time.render("pos_password_hash_wait_seconds", ""))
+            lines += [
+                "# HELP pos_password_hash_seconds Time spent deriving one hash.",
+                "# TYPE pos_password_hash_seconds histogram",
+            ]
+            lines.extend(self._hash_time.render("pos_password_hash_seconds", ""))
+        return lines
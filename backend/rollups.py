@@ -0,0 +1,274 @@
+# Per-business-day report rollups.
+#
+# Every write that changes report totals (create, void, refund) applies the
+# order to these tables inside its own transaction, so reports read one row
+# per business day instead of re-aggregating raw orders. product_totals() is
+# the product report reader (also run per store by stores.py); Z reports read
+# these rows through snapshots.snapshot_z_totals().
+
+# Business day is local time (UTC-6); created_at is stored in UTC
+BUSINESS_DATE_SQL = "date({}, '-6 hours')"
+# Local hour of day (0-23) on the same clock
+BUSINESS_HOUR_SQL = "CAST(strftime('%H', {}, '-6 hours') AS INTEGER)"
+
+
+def init_rollups(db, from_ts=None):
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS z_daily (
+            business_date TEXT PRIMARY KEY,
+            orders_count INTEGER NOT NULL DEFAULT 0,
+            subtotal_cents INTEGER NOT NULL DEFAULT 0,
+            paid_cents INTEGER NOT NULL DEFAULT 0,
+            change_cents INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS z_daily_payments (
+            business_date TEXT NOT NULL,
+            payment_method_id INTEGER NOT NULL,
+            payments_count INTEGER NOT NULL DEFAULT 0,
+            amount_cents INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (business_date, payment_method_id)
+        )
+    """)
+
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS product_daily (
+            business_date TEXT NOT NULL,
+            product_id INTEGER NOT NULL,
+            unit_price_cents INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            lines_count INTEGER NOT NULL DEFAULT 0,
+            qty INTEGER NOT NULL DEFAULT 0,
+            total_cents INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (business_date, product_id, unit_price_cents)
+        )
+    """)
+
+    # Per local hour, for the hourly / day-part report
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS z_hourly (
+            business_date TEXT NOT NULL,
+            hour INTEGER NOT NULL,
+            orders_count INTEGER NOT NULL DEFAULT 0,
+            subtotal_cents INTEGER NOT NULL DEFAULT 0,
+            paid_cents INTEGER NOT NULL DEFAULT 0,
+            change_cents INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (business_date, hour)
+        )
+    """)
+
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS z_hourly_payments (
+            business_date TEXT NOT NULL,
+            hour INTEGER NOT NULL,
+            payment_method_id INTEGER NOT NULL,
+            payments_count INTEGER NOT NULL DEFAULT 0,
+            amount_cents INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (business_date, hour, payment_method_id)
+        )
+    """)
+
+    # First start on an existing database: backfill from raw rows
+    if db.execute("SELECT 1 FROM orders LIMIT 1") and (
+        not db.execute("SELECT 1 FROM z_daily LIMIT 1")
+        or not db.execute("SELECT 1 FROM product_daily LIMIT 1")
+        or not db.execute("SELECT 1 FROM z_hourly LIMIT 1")
+    ):
+        rebuild_rollups(db, from_ts)
+
+
+def apply_order(db, order_id, sign=1):
+    """
+    Adds (sign=1) or subtracts (sign=-1) one order's totals to its business day.
+    Must run inside the caller's transaction.
+    """
+    business_date = BUSINESS_DATE_SQL.format("o.created_at")
+    hour = BUSINESS_HOUR_SQL.format("o.created_at")
+
+    db.execute(
+        f"""
+        INSERT INTO z_daily (business_date, orders_count, subtotal_cents, paid_cents, change_cents)
+        SELECT {business_date}, ?, ? * o.subtotal_cents, ? * o.total_paid_cents, ? * o.change_cents
+        FROM orders o
+        WHERE o.id = ?
+        ON CONFLICT (business_date) DO UPDATE SET
+            orders_count = orders_count + excluded.orders_count,
+            subtotal_cents = subtotal_cents + excluded.subtotal_cents,
+            paid_cents = paid_cents + excluded.paid_cents,
+            change_cents = change_cents + excluded.change_cents
+        """,
+        sign, sign, sign, sign, order_id
+    )
+
+    db.execute(
+        f"""
+        INSERT INTO z_daily_payments (business_date, payment_method_id, payments_count, amount_cents)
+        SELECT {business_date}, p.payment_method_id, ? * COUNT(*), ? * SUM(p.amount_cents)
+        FROM payments p
+        JOIN orders o ON o.id = p.order_id
+        WHERE p.order_id = ?
+        GROUP BY p.payment_method_id
+        ON CONFLICT (business_date, payment_method_id) DO UPDATE SET
+            payments_count = payments_count + excluded.payments_count,
+            amount_cents = amount_cents + excluded.amount_cents
+        """,
+        sign, sign, order_id
+    )
+
+    db.execute(
+        f"""
+        INSERT INTO product_daily (business_date, product_id, unit_price_cents, name, lines_count, qty, total_cents)
+        SELECT {business_date}, ol.product_id, ol.unit_price_cents, MAX(ol.name),
+               ? * COUNT(*), ? * SUM(ol.qty), ? * SUM(ol.line_total_cents)
+        FROM order_lines ol
+        JOIN orders o ON o.id = ol.order_id
+        WHERE ol.order_id = ?
+        GROUP BY ol.product_id, ol.unit_price_cents
+        ON CONFLICT (business_date, product_id, unit_price_cents) DO UPDATE SET
+            name = excluded.name,
+            lines_count = lines_count + excluded.lines_count,
+            qty = qty + excluded.qty,
+            total_cents = total_cents + excluded.total_cents
+        """,
+        sign, sign, sign, order_id
+    )
+
+    db.execute(
+        f"""
+        INSERT INTO z_hourly (business_date, hour, orders_count, subtotal_cents, paid_cents, change_cents)
+        SELECT {business_date}, {hour}, ?, ? * o.subtotal_cents, ? * o.total_paid_cents, ? * o.change_cents
+        FROM orders o
+        WHERE o.id = ?
+        ON CONFLICT (business_date, hour) DO UPDATE SET
+            orders_count = orders_count + excluded.orders_count,
+            subtotal_cents = subtotal_cents + excluded.subtotal_cents,
+            paid_cents = paid_cents + excluded.paid_cents,
+            change_cents = change_cents + excluded.change_cents
+        """,
+        sign, sign, sign, sign, order_id
+    )
+
+    db.execute(
+        f"""
+        INSERT INTO z_hourly_payments (business_date, hour, payment_method_id, payments_count, amount_cents)
+        SELECT {business_date}, {hour}, p.payment_method_id, ? * COUNT(*), ? * SUM(p.amount_cents)
+        FROM payments p
+        JOIN orders o ON o.id = p.order_id
+        WHERE p.order_id = ?
+        GROUP BY p.payment_method_id
+        ON CONFLICT (business_date, hour, payment_method_id) DO UPDATE SET
+            payments_count = payments_count + excluded.payments_count,
+            amount_cents = amount_cents + excluded.amount_cents
+        """,
+        sign, sign, order_id
+    )
+
+    # A closed day's Z snapshot no longer matches; the next close re-snapshots it (see snapshots.py)
+    db.execute(
+        f"""
+        UPDATE z_snapshots SET stale_at = CURRENT_TIMESTAMP
+        WHERE business_date = (SELECT {business_date} FROM orders o WHERE o.id = ?)
+          AND superseded_at IS NULL AND stale_at IS NULL
+        """,
+        order_id
+    )
+
+
+def rebuild_rollups(db, from_ts=None):
+    """
+    Regenerates every rollup from raw orders, lines and payments.
+    Voided orders are excluded, matching the live report rules.
+    from_ts (a business-day boundary, e.g. the end of the archived months)
+    keeps rollup days before it, whose raw rows are no longer in this database.
+    """
+    business_date = BUSINESS_DATE_SQL.format("o.created_at")
+    hour = BUSINESS_HOUR_SQL.format("o.created_at")
+    from_date = BUSINESS_DATE_SQL.format("?")
+
+    with db.transaction():
+        for table in ("z_daily", "z_daily_payments", "product_daily", "z_hourly", "z_hourly_payments"):
+            if from_ts:
+                db.execute(f"DELETE FROM {table} WHERE business_date >= {from_date}", from_ts)
+            else:
+                db.execute(f"DELETE FROM {table}")
+        from_ts = from_ts or ""
+
+        db.execute(f"""
+            INSERT INTO z_daily (business_date, orders_count, subtotal_cents, paid_cents, change_cents)
+            SELECT {business_date}, COUNT(*), SUM(o.subtotal_cents), SUM(o.total_paid_cents), SUM(o.change_cents)
+            FROM orders o
+            WHERE (o.status IS NULL OR o.status != 'void') AND o.created_at >= ?
+            GROUP BY 1
+        """, from_ts)
+
+        db.execute(f"""
+            INSERT INTO z_daily_payments (business_date, payment_method_id, payments_count, amount_cents)
+            SELECT {business_date}, p.payment_method_id, COUNT(*), SUM(p.amount_cents)
+            FROM payments p
+            JOIN orders o ON o.id = p.order_id
+            WHERE (o.status IS NULL OR o.status != 'void') AND o.created_at >= ?
+            GROUP BY 1, p.payment_method_id
+        """, from_ts)
+
+        db.execute(f"""
+            INSERT INTO product_daily (business_date, product_id, unit_price_cents, name, lines_count, qty, total_cents)
+            SELECT {business_date}, ol.product_id, ol.unit_price_cents, MAX(ol.name),
+                   COUNT(*), SUM(ol.qty), SUM(ol.line_total_cents)
+            FROM order_lines ol
+            JOIN orders o ON o.id = ol.order_id
+            WHERE (o.status IS NULL OR o.status != 'void') AND o.created_at >= ?
+            GROUP BY 1, ol.product_id, ol.unit_price_cents
+        """, from_ts)
+
+        db.execute(f"""
+            INSERT INTO z_hourly (business_date, hour, orders_count, subtotal_cents, paid_cents, change_cents)
+            SELECT {business_date}, {hour}, COUNT(*), SUM(o.subtotal_cents), SUM(o.total_paid_cents), SUM(o.change_cents)
+            FROM orders o
+            WHERE (o.status IS NULL OR o.status != 'void') AND o.created_at >= ?
+            GROUP BY 1, 2
+        """, from_ts)
+
+        db.execute(f"""
+            INSERT INTO z_hourly_payments (business_date, hour, payment_method_id, payments_count, amount_cents)
+            SELECT {business_date}, {hour}, p.payment_method_id, COUNT(*), SUM(p.amount_cents)
+            FROM payments p
+            JOIN orders o ON o.id = p.order_id
+            WHERE (o.status IS NULL OR o.status != 'void') AND o.created_at >= ?
+            GROUP BY 1, 2, p.payment_method_id
+        """, from_ts)
+
+
+def product_totals(db, start_date, end_date):
+    """
+    Product report rows for business days start_date..end_date (inclusive),
+    merged from the per-day product rollup.
+    Returns: [{"product_id", "name", "unit_price_cents", "qty", "total_cents"}]
+    """
+    rows = db.execute(
+        """
+        SELECT
+            product_id,
+            MAX(name) AS name,
+            unit_price_cents,
+            SUM(qty) AS qty,
+            SUM(total_cents) AS total_cents
+        FROM product_daily
+        WHERE business_date BETWEEN ? AND ?
+        GROUP BY product_id, unit_price_cents
+        HAVING SUM(lines_count) > 0
+        ORDER BY name, unit_price_cents DESC
+        """,
+        start_date, end_date
+    )
+    return [
+        {
+            "product_id": int(r["product_id"]),
+            "name": r["name"],
+            "unit_price_cents": int(r["unit_price_cents"]),
+            "qty": int(r["qty"]),
+            "total_cents": int(r["total_cents"]),
+        }
+        for r in rows
+    ]
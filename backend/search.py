@@ -0,0 +1,67 @@
+# Full-text order search (SQLite FTS5).
+#
+# One row per order, rowid = order id: the id as text, the cashier's
+# username, and every line name and comment. insert_order and refund_order
+# index the order inside their transaction; voids change no searchable text.
+# Monthly archives carry their months' rows (see archive.py).
+import re
+
+SEARCH_COLUMNS = ("order_ref", "username", "items")
+
+
+def init_search(db, users_table="users"):
+    # users_table lets an archive file built before the index borrow the hot users table
+    db.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS order_search USING fts5(
+            {", ".join(SEARCH_COLUMNS)},
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+    """)
+    if db.execute("SELECT 1 FROM orders LIMIT 1") and not db.execute("SELECT 1 FROM order_search LIMIT 1"):
+        rebuild_search(db, users_table)
+
+
+def _document_sql(where, users_table="users"):
+    return f"""
+        INSERT INTO order_search (rowid, {", ".join(SEARCH_COLUMNS)})
+        SELECT
+            o.id,
+            o.id,
+            u.username,
+            (
+                SELECT group_concat(ol.name || COALESCE(' ' || ol.comment, ''), ' ')
+                FROM order_lines ol
+                WHERE ol.order_id = o.id
+            )
+        FROM orders o
+        LEFT JOIN {users_table} u ON u.id = o.user_id
+        WHERE {where}
+    """
+
+
+def index_order(db, order_id):
+    """
+    Adds one order (with its lines already written) to the search index.
+    Must run inside the caller's transaction.
+    """
+    db.execute(_document_sql("o.id = ?"), order_id)
+
+
+def rebuild_search(db, users_table="users"):
+    with db.transaction():
+        db.execute("DELETE FROM order_search")
+        db.execute(_document_sql("1", users_table))
+
+
+def match_query(text):
+    """
+    Returns: an FTS5 MATCH expression requiring every word of text as a
+    prefix ("no onion" finds "no onions"), or None when text has no words.
+    """
+    # unicode61 splits on every non-alphanumeric character, so "no-onions" and
+    # "O'Brien" are two tokens each; split the query the same way
+    words = re.findall(r"[^\W_]+", text)
+    if not words:
+        return None
+    return " ".join(f'"{w}"*' for w in words)
@@ -0,0 +1,156 @@
+# Slow-query log.
+#
+# Sits in the Database observer chain (see database.py) in front of metrics.
+# A statement is recorded when it runs longer than threshold_ms, or - once
+# per distinct statement - when its EXPLAIN QUERY PLAN shows a full table
+# scan, so a missing index is caught while the table is still small enough
+# to be fast. Entries go to a size-rotated JSON-lines file and to a ring
+# buffer served by GET /api/debug/slow-queries. Parameters of statements on
+# REDACTED_TABLES are replaced before either sees them.
+import json
+import logging
+import re
+import threading
+from collections import deque
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from metrics import statement_label
+
+# Reading these whole is expected (catalog snapshot, rollup backfill)
+SCAN_OK_TABLES = {"products", "payment_methods", "catalog_version", "catalog_deletions", "sqlite_master"}
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+# Bound parameters of statements touching these tables are never recorded
+# (users holds password hashes)
+REDACTED_TABLES = ("users",)
+_REDACTED = re.compile(r"\b(?:" + "|".join(REDACTED_TABLES) + r")\b", re.I)
+
+
+def _param_repr(value):
+    if isinstance(value, str) and len(value) > 64:
+        return value[:61] + "..."
+    return value
+
+
+def full_scans(plan, sql=""):
+    """
+    Returns: tables the plan reads without an index, e.g. ["orders"].
+    """
+    # CTEs and FROM-subqueries are introduced as "CO-ROUTINE days" / "MATERIALIZE x";
+    # scanning their results is not a table read
+    derived = set()
+    for row in plan:
+        words = row.split()
+        if len(words) > 1 and words[0] in ("CO-ROUTINE", "MATERIALIZE"):
+            derived.add(words[1])
+    steps = [row for row in plan if row.startswith(("SCAN ", "SEARCH "))]
+    # "SELECT id FROM orders ORDER BY id DESC LIMIT ?" walks rowid order and stops after LIMIT rows
+    bounded_walk = (
+        len(steps) == 1
+        and not any("TEMP B-TREE" in row for row in plan)
+        and re.search(r"\bLIMIT\b", sql, re.I)
+        and not re.search(r"\bWHERE\b", sql, re.I)
+    )
+    tables = []
+    for row in plan:
+        words = row.split()
+        if len(words) < 2 or words[0] != "SCAN" or "INDEX" in words or "VIRTUAL" in words:
+            continue
+        # "SCAN CONSTANT ROW" and "SCAN (subquery-1)" are not table reads
+        if words[1] == "CONSTANT" or words[1].startswith("(") or words[1] in SCAN_OK_TABLES:
+            continue
+        if words[1] in derived or bounded_walk:
+            continue
+        tables.append(words[1])
+    return tables
+
+
+class SlowQueryLog:
+    def __init__(self, db, threshold_ms=100.0, path=None, max_bytes=5_000_000, backups=3, keep=200, forward=None):
+        self.db = db
+        self.threshold = threshold_ms / 1000.0
+        self.forward = forward
+        self._recent = deque(maxlen=keep)
+        self._checked = set()  # statement labels whose plan has been looked at
+        self._lock = threading.Lock()
+        self._logger = None
+        if path:
+            self._logger = logging.getLogger(f"pos.slow_queries.{id(self)}")
+            self._logger.propagate = False
+            self._logger.setLevel(logging.INFO)
+            handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._logger.addHandler(handler)
+
+    # --- Database observer interface
+    def query(self, sql, seconds, rows, params, db=None):
+        if self.forward is not None:
+            self.forward.query(sql, seconds, rows, params, db)
+
+        label = statement_label(sql)
+        slow = seconds >= self.threshold
+        first_seen = label not in self._checked
+        if not slow and not first_seen:
+            return
+
+        plan = self._explain(db or self.db, sql, params)
+        if first_seen:
+            with self._lock:
+                self._checked.add(label)
+        scans = full_scans(plan, sql)
+        if slow:
+            self._record("slow", sql, seconds, rows, params, plan, scans)
+        elif first_seen and scans:
+            self._record("full_scan", sql, seconds, rows, params, plan, scans)
+
+    def lock_wait(self, seconds):
+        if self.forward is not None:
+            self.forward.lock_wait(seconds)
+
+    def transaction(self, seconds):
+        if self.forward is not None:
+            self.forward.transaction(seconds)
+
+    def recent(self):
+        """
+        Returns: newest-first list of recorded entries (dicts).
+        """
+        with self._lock:
+            return list(reversed(self._recent))
+
+    def _explain(self, db, sql, params):
+        if not sql.lstrip()[:6].upper().startswith(EXPLAINABLE):
+            return []
+        if params is None:
+            # executemany: the plan doesn't depend on the values
+            params = (None,) * sql.count("?")
+        try:
+            # On the database (hot or an archive) whose connection ran the statement
+            cursor = db.connection().execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            return [row["detail"] for row in cursor.fetchall()]
+        except Exception as e:
+            return [f"(explain failed: {e})"]
+
+    def _params(self, sql, params):
+        if params is None:
+            return None
+        if _REDACTED.search(sql):
+            return ["[redacted]"] * len(params)
+        return [_param_repr(p) for p in params]
+
+    def _record(self, reason, sql, seconds, rows, params, plan, scans):
+        entry = {
+            "at": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+            "reason": reason,
+            "ms": round(seconds * 1000, 3),
+            "rows": rows,
+            "statement": " ".join(sql.split()),
+            "params": self._params(sql, params),
+            "plan": plan,
+            "full_scans": scans,
+        }
+        with self._lock:
+            self._recent.append(entry)
+        if self._logger is not None:
+            self._logger.info(json.dumps(entry, default=str))
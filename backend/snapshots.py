@@ -0,0 +1,298 @@
+# Closed-day Z snapshots.
+#
+# Once a business day is over, close_days() (the close-days command, run
+# nightly) copies its z_daily / z_daily_payments rows into z_snapshots /
+# z_snapshot_payments as version 1.
+# Snapshot rows are never updated or deleted (triggers enforce it). A late
+# change to a closed day (a void, or an offline batch order backdated into it)
+# only stamps stale_at on the current version, inside the write's own
+# transaction (see rollups.apply_order); the next close writes version n+1 and
+# stamps superseded_at on the old one, so every figure a report ever showed
+# for a day stays on record.
+#
+# snapshot_z_totals() reads fresh snapshots for closed days and the live
+# rollup only for today, stale days and days not closed yet.
+
+SNAPSHOT_TOTALS = ("orders_count", "subtotal_cents", "paid_cents", "change_cents")
+
+# Business "yesterday" (local time, UTC-6): the newest day that can be closed
+LAST_CLOSED_DAY_SQL = "date('now', '-6 hours', '-1 day')"
+
+FRESH = "superseded_at IS NULL AND stale_at IS NULL"
+
+
+def init_snapshots(db):
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS z_snapshots (
+            business_date TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            orders_count INTEGER NOT NULL,
+            subtotal_cents INTEGER NOT NULL,
+            paid_cents INTEGER NOT NULL,
+            change_cents INTEGER NOT NULL,
+            reason TEXT NOT NULL,
+            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            stale_at TEXT,
+            superseded_at TEXT,
+            PRIMARY KEY (business_date, version)
+        )
+    """)
+
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS z_snapshot_payments (
+            business_date TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            payment_method_id INTEGER NOT NULL,
+            payments_count INTEGER NOT NULL,
+            amount_cents INTEGER NOT NULL,
+            PRIMARY KEY (business_date, version, payment_method_id)
+        )
+    """)
+
+    # One current version per day; stale ones are found without a scan
+    db.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_z_snapshots_current
+        ON z_snapshots(business_date) WHERE superseded_at IS NULL
+    """)
+    db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_z_snapshots_stale
+        ON z_snapshots(business_date) WHERE stale_at IS NOT NULL AND superseded_at IS NULL
+    """)
+
+    # Figures are immutable; only the stale_at / superseded_at stamps may be set
+    db.execute("""
+        CREATE TRIGGER IF NOT EXISTS z_snapshots_immutable
+        BEFORE UPDATE OF business_date, version, orders_count, subtotal_cents, paid_cents, change_cents, reason, created_at
+        ON z_snapshots
+        BEGIN
+            SELECT RAISE(ABORT, 'z snapshots are immutable');
+        END
+    """)
+    db.execute("""
+        CREATE TRIGGER IF NOT EXISTS z_snapshots_no_delete
+        BEFORE DELETE ON z_snapshots
+        BEGIN
+            SELECT RAISE(ABORT, 'z snapshots are immutable');
+        END
+    """)
+    db.execute("""
+        CREATE TRIGGER IF NOT EXISTS z_snapshot_payments_immutable
+        BEFORE UPDATE ON z_snapshot_payments
+        BEGIN
+            SELECT RAISE(ABORT, 'z snapshots are immutable');
+        END
+    """)
+    db.execute("""
+        CREATE TRIGGER IF NOT EXISTS z_snapshot_payments_no_delete
+        BEFORE DELETE ON z_snapshot_payments
+        BEGIN
+            SELECT RAISE(ABORT, 'z snapshots are immutable');
+        END
+    """)
+
+
+def _snapshot_day(db, business_date, reason):
+    version = db.execute(
+        "SELECT COALESCE(MAX(version), 0) + 1 AS v FROM z_snapshots WHERE business_date = ?",
+        business_date
+    )[0]["v"]
+    db.execute(
+        "UPDATE z_snapshots SET superseded_at = CURRENT_TIMESTAMP WHERE business_date = ? AND superseded_at IS NULL",
+        business_date
+    )
+    # Aggregates over no row still yield one row, so quiet days close as zeros
+    db.execute(
+        """
+        INSERT INTO z_snapshots (business_date, version, orders_count, subtotal_cents, paid_cents, change_cents, reason)
+        SELECT ?, ?, COALESCE(SUM(orders_count), 0), COALESCE(SUM(subtotal_cents), 0),
+               COALESCE(SUM(paid_cents), 0), COALESCE(SUM(change_cents), 0), ?
+        FROM z_daily
+        WHERE business_date = ?
+        """,
+        business_date, version, reason, business_date
+    )
+    db.execute(
+        """
+        INSERT INTO z_snapshot_payments (business_date, version, payment_method_id, payments_count, amount_cents)
+        SELECT business_date, ?, payment_method_id, payments_count, amount_cents
+        FROM z_daily_payments
+        WHERE business_date = ?
+        """,
+        version, business_date
+    )
+
+
+def _drifted_days(db):
+    # Current snapshots whose figures no longer match the rollup (after rebuild_rollups)
+    totals_differ = " OR ".join(f"s.{c} != COALESCE(d.{c}, 0)" for c in SNAPSHOT_TOTALS)
+    rows = db.execute(f"""
+        SELECT s.business_date
+        FROM z_snapshots s
+        LEFT JOIN z_daily d ON d.business_date = s.business_date
+        WHERE s.{FRESH} AND ({totals_differ})
+        UNION
+        SELECT business_date FROM (
+            SELECT sp.business_date, sp.payment_method_id, sp.payments_count, sp.amount_cents
+            FROM z_snapshot_payments sp
+            JOIN z_snapshots s ON s.business_date = sp.business_date AND s.version = sp.version
+            WHERE s.{FRESH}
+            EXCEPT
+            SELECT business_date, payment_method_id, payments_count, amount_cents FROM z_daily_payments
+        )
+        UNION
+        SELECT business_date FROM (
+            SELECT business_date, payment_method_id, payments_count, amount_cents
+            FROM z_daily_payments
+            WHERE business_date IN (SELECT business_date FROM z_snapshots WHERE {FRESH})
+            EXCEPT
+            SELECT sp.business_date, sp.payment_method_id, sp.payments_count, sp.amount_cents
+            FROM z_snapshot_payments sp
+            JOIN z_snapshots s ON s.business_date = sp.business_date AND s.version = sp.version
+            WHERE s.{FRESH}
+        )
+    """)
+    return [r["business_date"] for r in rows]
+
+
+def close_days(db, recheck=False):
+    """
+    Snapshots every finished business day that has none, and writes a new
+    version for every stale one. recheck also re-snapshots days whose figures
+    drifted from the rollup (run after rebuild_rollups).
+    Returns: {"closed": n, "rebuilt": n}
+    """
+    with db.transaction():
+        rebuilt = [
+            r["business_date"]
+            for r in db.execute(
+                "SELECT business_date FROM z_snapshots WHERE stale_at IS NOT NULL AND superseded_at IS NULL"
+            )
+        ]
+        for business_date in rebuilt:
+            _snapshot_day(db, business_date, "late change")
+
+        if recheck:
+            drifted = _drifted_days(db)
+            for business_date in drifted:
+                _snapshot_day(db, business_date, "rollup rebuild")
+            rebuilt += drifted
+
+        # Every finished day with sales, plus the quiet days since the newest
+        # closed day. Gaps before it are left to the live rollup (they read as
+        # zero either way), so one far-backdated order closes one day, not
+        # every day since.
+        unclosed = db.execute(f"""
+            WITH RECURSIVE days(business_date) AS (
+                SELECT date(MAX(business_date), '+1 day') FROM z_snapshots WHERE superseded_at IS NULL
+                UNION ALL
+                SELECT date(business_date, '+1 day') FROM days WHERE business_date < {LAST_CLOSED_DAY_SQL}
+            )
+            SELECT business_date FROM days
+            WHERE business_date <= {LAST_CLOSED_DAY_SQL}
+            UNION
+            SELECT business_date FROM z_daily
+            WHERE business_date <= {LAST_CLOSED_DAY_SQL}
+            EXCEPT
+            SELECT business_date FROM z_snapshots WHERE superseded_at IS NULL
+            ORDER BY business_date
+        """)
+        for r in unclosed:
+            _snapshot_day(db, r["business_date"], "close")
+
+    return {"closed": len(unclosed), "rebuilt": len(rebuilt)}
+
+
+def snapshot_z_totals(db, start_date, end_date):
+    """
+    Z report for business days start_date..end_date (inclusive): fresh
+    snapshots for closed days, the live rollup for every other day.
+    Returns: {"totals": {...}, "payments_by_method": [{"method", "amount_cents"}]}
+    """
+    columns = ", ".join(SNAPSHOT_TOTALS)
+    sums = ", ".join(f"COALESCE(SUM({c}), 0) AS {c}" for c in SNAPSHOT_TOTALS)
+    live_days = f"""
+        business_date BETWEEN ? AND ?
+        AND NOT EXISTS (
+            SELECT 1 FROM z_snapshots s
+            WHERE s.business_date = z.business_date AND s.{FRESH}
+        )
+    """
+    totals = db.execute(
+        f"""
+        SELECT {sums}
+        FROM (
+            SELECT {columns} FROM z_snapshots WHERE business_date BETWEEN ? AND ? AND {FRESH}
+            UNION ALL
+            SELECT {columns} FROM z_daily z WHERE {live_days}
+        )
+        """,
+        start_date, end_date, start_date, end_date
+    )[0]
+
+    payments = db.execute(
+        f"""
+        SELECT
+            pm.name AS method,
+            COALESCE(SUM(x.amount_cents), 0) AS amount_cents
+        FROM (
+            SELECT sp.payment_method_id, sp.payments_count, sp.amount_cents
+            FROM z_snapshots s
+            JOIN z_snapshot_payments sp ON sp.business_date = s.business_date AND sp.version = s.version
+            WHERE s.business_date BETWEEN ? AND ? AND s.{FRESH}
+            UNION ALL
+            SELECT z.payment_method_id, z.payments_count, z.amount_cents
+            FROM z_daily_payments z
+            WHERE {live_days}
+        ) x
+        JOIN payment_methods pm ON pm.id = x.payment_method_id
+        GROUP BY pm.id, pm.name
+        HAVING SUM(x.payments_count) > 0
+        ORDER BY pm.id
+        """,
+        start_date, end_date, start_date, end_date
+    )
+
+    return {
+        "totals": {key: int(value) for key, value in totals.items()},
+        "payments_by_method": [
+            {"method": r["method"], "amount_cents": int(r["amount_cents"])}
+            for r in payments
+        ],
+    }
+
+
+def snapshot_history(db, start_date, end_date):
+    """
+    Returns: every snapshot version for days start_date..end_date, oldest day
+    and version first, each with its payments by method.
+    """
+    rows = db.execute(
+        """
+        SELECT * FROM z_snapshots
+        WHERE business_date BETWEEN ? AND ?
+        ORDER BY business_date, version
+        """,
+        start_date, end_date
+    )
+    payments = {}
+    for p in db.execute(
+        """
+        SELECT sp.business_date, sp.version, pm.name AS method, sp.payments_count, sp.amount_cents
+        FROM z_snapshot_payments sp
+        JOIN payment_methods pm ON pm.id = sp.payment_method_id
+        WHERE sp.business_date BETWEEN ? AND ? AND sp.payments_count > 0
+        ORDER BY sp.business_date, sp.version, pm.id
+        """,
+        start_date, end_date
+    ):
+        payments.setdefault((p["business_date"], p["version"]), []).append(
+            {"method": p["method"], "amount_cents": int(p["amount_cents"])}
+        )
+    return [
+        {
+            **{key: r[key] for key in ("business_date", "version", "reason", "created_at", "stale_at", "superseded_at")},
+            "totals": {key: int(r[key]) for key in SNAPSHOT_TOTALS},
+            "payments_by_method": payments.get((r["business_date"], r["version"]), []),
+        }
+        for r in rows
+    ]
@@ -0,0 +1,198 @@
+# Multi-store (chain) reporting.
+#
+# Every store runs its own deployment with its own pos.db. A head-office
+# deployment lists those files in POS_STORES ("centro=/data/centro/pos.db,
+# norte=/data/norte/pos.db") and GET /api/reports/z|products take
+# ?stores=centro,norte (or all). Each store's report is read from its own
+# rollups in a separate pool process, so a chain-wide report takes about as
+# long as the slowest store; the request thread only merges the small results.
+#
+# Products are merged on (product_id, unit_price_cents), so stores are expected
+# to share catalog ids (all seeded from the same products.csv). Payment
+# methods are merged by name.
+import multiprocessing
+import os
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from database import Database
+from rollups import product_totals
+from snapshots import snapshot_z_totals
+
+REPORTS = {"z": snapshot_z_totals, "products": product_totals}
+
+# Per pool process: path -> Database, reused across tasks
+_databases = {}
+
+
+class StoreError(Exception):
+    pass
+
+
+def parse_stores(spec):
+    """
+    Returns: {name: path} from "name=path,name=path", in the order given.
+    """
+    stores = {}
+    for entry in (spec or "").split(","):
+        if not entry.strip():
+            continue
+        name, sep, path = entry.partition("=")
+        name, path = name.strip(), path.strip()
+        if not sep or not name or not path:
+            raise StoreError(f"invalid store entry {entry.strip()!r}, expected name=path")
+        if name in stores:
+            raise StoreError(f"store {name} listed twice")
+        stores[name] = path
+    return stores
+
+
+def _store_report(kind, path, start_date, end_date):
+    # Runs in a pool process
+    db = _databases.get(path)
+    if db is None:
+        # sqlite3 would quietly create an empty database for a mistyped path
+        if not os.path.exists(path):
+            raise StoreError("database file not found")
+        db = _databases[path] = Database(path, pool_size=1)
+    try:
+        return REPORTS[kind](db, start_date, end_date)
+    finally:
+        db.release()
+
+
+def _noop():
+    return None
+
+
+def merge_z(results):
+    """
+    Returns: one Z body ({"totals", "payments_by_method"}) summing the per-store bodies.
+    """
+    totals = {"orders_count": 0, "subtotal_cents": 0, "paid_cents": 0, "change_cents": 0}
+    methods = {}  # name -> cents, first-seen order
+    for body in results:
+        for key in totals:
+            totals[key] += body["totals"][key]
+        for p in body["payments_by_method"]:
+            methods[p["method"]] = methods.get(p["method"], 0) + p["amount_cents"]
+    return {
+        "totals": totals,
+        "payments_by_method": [{"method": m, "amount_cents": cents} for m, cents in methods.items()],
+    }
+
+
+def merge_products(results):
+    """
+    Returns: product rows summed across stores, ordered like a single-store report.
+    """
+    merged = {}
+    for rows in results:
+        for r in rows:
+            key = (r["product_id"], r["unit_price_cents"])
+            row = merged.get(key)
+            if row is None:
+                merged[key] = dict(r)
+            else:
+                row["name"] = max(row["name"], r["name"])
+                row["qty"] += r["qty"]
+                row["total_cents"] += r["total_cents"]
+    return sorted(merged.values(), key=lambda r: (r["name"], -r["unit_price_cents"]))
+
+
+class StoreReports:
+    def __init__(self, stores, workers=None, timeout=30):
+        self.stores = stores
+        self.workers = workers or min(len(stores), os.cpu_count() or 1) or 1
+        self.timeout = timeout
+        self._pool = None
+        self._lock = threading.Lock()
+        # A pool's processes belong to the process that started them
+        os.register_at_fork(after_in_child=self._forget_pool)
+
+    def _forget_pool(self):
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Starts the pool processes now (e.g. in a server worker before it takes
+        requests) instead of on the first chain report.
+        """
+        self._executor().submit(_noop).result()
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                # forkserver, not fork: forking a threaded server worker can
+                # copy a lock some other thread holds. Pool processes are
+                # forked from a clean server process that has imported only
+                # this module (not the app, its database or signal handlers)
+                context = multiprocessing.get_context("forkserver")
+                context.set_forkserver_preload(["stores"])
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            return self._pool
+
+    def resolve(self, spec):
+        """
+        Returns: store names from a ?stores= value ("all" or "a,b"), in configured order.
+        """
+        if spec.strip().lower() == "all":
+            return list(self.stores)
+        names = [name.strip() for name in spec.split(",") if name.strip()]
+        if not names:
+            raise StoreError("no stores given")
+        for name in names:
+            if name not in self.stores:
+                raise StoreError(f"unknown store: {name}")
+        return [name for name in self.stores if name in names]
+
+    def run(self, kind, names, start_date, end_date):
+        """
+        Computes report kind ("z" or "products") for every store in parallel.
+        Returns: {name: body} in names order.
+        Raises: StoreError naming the first store that failed.
+        """
+        pool = self._executor()
+        try:
+            futures = self._submit(pool, kind, names, start_date, end_date)
+        except BrokenProcessPool:
+            # A pool process died since the last report; start a fresh pool once
+            self._discard(pool)
+            pool = self._executor()
+            futures = self._submit(pool, kind, names, start_date, end_date)
+        # One deadline for the whole report, not one per store
+        done, pending = wait(futures.values(), timeout=self.timeout, return_when=FIRST_EXCEPTION)
+        for name, future in futures.items():
+            if future in pending:
+                error = TimeoutError(f"no answer within {self.timeout:g}s")
+            else:
+                error = future.exception()
+                if error is None:
+                    continue
+            for other in pending:
+                other.cancel()
+            if isinstance(error, BrokenProcessPool):
+                # A pool process died mid-report; the next report gets a fresh pool
+                self._discard(pool)
+            raise StoreError(f"store {name} unavailable: {str(error) or type(error).__name__}") from error
+        return {name: future.result() for name, future in futures.items()}
+
+    def _submit(self, pool, kind, names, start_date, end_date):
+        return {
+            name: pool.submit(_store_report, kind, self.stores[name], start_date, end_date)
+            for name in names
+        }
+
+    def _discard(self, pool):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
@@ -0,0 +1,47 @@
+# In-process user id -> username directory.
+#
+# Usernames never change once registered, so entries never go stale. Order
+# history, detail and export resolve cashier names here instead of joining
+# users on every row; ids not seen yet are fetched in one IN (...) query.
+import threading
+
+LOOKUP_CHUNK = 500
+
+
+class UserDirectory:
+    def __init__(self, db):
+        self.db = db
+        self._names = {}  # user_id -> username, or None for ids with no user row
+        self._lock = threading.Lock()
+
+    def remember(self, user_id, username):
+        with self._lock:
+            self._names[int(user_id)] = username
+
+    def usernames(self, user_ids):
+        """
+        Returns: {user_id: username} for the given ids that belong to a user.
+        """
+        wanted = {int(i) for i in user_ids if i is not None}
+        missing = [i for i in wanted if i not in self._names]
+        for start in range(0, len(missing), LOOKUP_CHUNK):
+            chunk = missing[start:start + LOOKUP_CHUNK]
+            rows = self.db.execute(
+                f"SELECT id, username FROM users WHERE id IN ({', '.join('?' * len(chunk))})",
+                *chunk
+            )
+            found = {int(r["id"]): r["username"] for r in rows}
+            with self._lock:
+                for user_id in chunk:
+                    self._names[user_id] = found.get(user_id)
+
+        names = self._names
+        return {i: names[i] for i in wanted if names.get(i) is not None}
+
+    def load_all(self):
+        for r in self.db.execute("SELECT id, username FROM users"):
+            self.remember(r["id"], r["username"])
+
+    def username(self, user_id):
+        return self.usernames([user_id]).get(int(user_id))
+
@@ -6,6 +6,8 @@ function formatMoney(cents) {
   return (Number(cents || 0) / 100).toFixed(2);
 }
 
+const PAGE_SIZE = 100;
+
 export default function OrderHistory() {
   const user = useAuthStore((s) => s.user);
   const authChecked = useAuthStore((s) => s.authChecked);
@@ -19,16 +21,24 @@ export default function OrderHistory() {
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
   const [orders, setOrders] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [total, setTotal] = useState(null);
+  // Filters of the first page on screen; "Load more" keeps using them even
+  // after the inputs are edited, so every page comes from the same query
+  const [applied, setApplied] = useState(null);
 
-  const loadOrders = async (s = startDate, e = endDate) => {
+  const loadOrders = async (filters, cursor = null) => {
     setLoading(true);
     setError(null);
     try {
       const params = new URLSearchParams();
-      if (s) params.set("start_date", s);
-      if (e) params.set("end_date", e);
-      if (status) params.set("status", status);
-      if (q.trim()) params.set("q", q.trim());
+      if (filters.start) params.set("start_date", filters.start);
+      if (filters.end) params.set("end_date", filters.end);
+      if (filters.status) params.set("status", filters.status);
+      if (filters.q) params.set("q", filters.q);
+      params.set("limit", String(PAGE_SIZE));
+      if (cursor) params.set("cursor", cursor);
+      else params.set("include_total", "1");
       const res = await fetch(`/api/orders?${params.toString()}`, {
         credentials: "include",
       });
@@ -38,7 +48,13 @@ export default function OrderHistory() {
         setLoading(false);
         return;
       }
-      setOrders(data?.orders ?? []);
+      const page = data?.orders ?? [];
+      setOrders((prev) => (cursor ? [...prev, ...page] : page));
+      setNextCursor(data?.next_cursor ?? null);
+      if (!cursor) {
+        setTotal(data?.total ?? null);
+        setApplied(filters);
+      }
     } catch {
       setError("Network error");
     }
@@ -46,7 +62,7 @@ export default function OrderHistory() {
   };
 
   useEffect(() => {
-    loadOrders(today, today);
+    loadOrders({ start: today, end: today, status: "all", q: "" });
   }, []);
 
   if (!authChecked) {
@@ -104,13 +120,15 @@ export default function OrderHistory() {
               type="text"
               value={q}
               onChange={(e) => setQ(e.target.value)}
-              placeholder="Order # or username"
+              placeholder="Order #, cashier, item or comment"
               className="bg-zinc-900 border border-zinc-700 rounded px-2 py-1 text-sm"
             />
           </div>
           <button
             type="button"
-            onClick={() => loadOrders()}
+            onClick={() =>
+              loadOrders({ start: startDate, end: endDate, status, q: q.trim() })
+            }
             className="px-3 py-2 rounded bg-emerald-600 hover:bg-emerald-500"
           >
             Run
@@ -175,6 +193,22 @@ export default function OrderHistory() {
             </tbody>
           </table>
         </div>
+
+        <div className="mt-3 flex items-center justify-between text-sm text-zinc-400">
+          <div>
+            {total !== null && `Showing ${orders.length} of ${total}`}
+          </div>
+          {nextCursor && (
+            <button
+              type="button"
+              disabled={loading}
+              onClick={() => loadOrders(applied, nextCursor)}
+              className="px-3 py-2 rounded bg-zinc-800 hover:bg-zinc-700 text-fg disabled:opacity-50"
+            >
+              Load more
+            </button>
+          )}
+        </div>
       </div>
     </div>
   );
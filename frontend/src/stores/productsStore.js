@@ -1,7 +1,20 @@
 import { create } from "zustand";
 
+// Applies a `?since_version=` delta to the cached list: changed products are
+// replaced, deactivated or removed ones dropped.
+function mergeDelta(items, delta) {
+  const byId = new Map(items.map((p) => [p.id, p]));
+  for (const p of delta.products ?? []) {
+    if (p.isActive) byId.set(p.id, p);
+    else byId.delete(p.id);
+  }
+  for (const id of delta.removed ?? []) byId.delete(id);
+  return [...byId.values()].sort((a, b) => a.name.localeCompare(b.name));
+}
+
 export const useProductsStore = create((set, get) => ({
   items: [],
+  version: null,
   loading: false,
   error: null,
   loaded: false,
@@ -11,13 +24,20 @@ export const useProductsStore = create((set, get) => ({
 
     set({ loading: true, error: null });
 
+    const { loaded, version } = get();
+    const delta = loaded && version !== null;
+    const url = delta
+      ? `/api/products?since_version=${version}`
+      : "/api/products";
+
     try {
-      const res = await fetch("/api/products", { credentials: "include" });
+      const res = await fetch(url, { credentials: "include" });
       const data = await res.json().catch(() => null);
 
       if (!res.ok) {
         set({
           items: [],
+          version: null,
           loading: false,
           error: data?.error || "Failed to load products",
           loaded: false,
@@ -26,7 +46,8 @@ export const useProductsStore = create((set, get) => ({
       }
 
       set({
-        items: data?.products ?? [],
+        items: delta ? mergeDelta(get().items, data) : data?.products ?? [],
+        version: data?.version ?? null,
         loading: false,
         error: null,
         loaded: true,
@@ -36,6 +57,7 @@ export const useProductsStore = create((set, get) => ({
     } catch {
       set({
         items: [],
+        version: null,
         loading: false,
         error: "Network error",
         loaded: false,